@@ -0,0 +1,123 @@
+"""
+A structured access log for `myServerStudent.py`, written off the request
+path.
+
+Request threads only append a tuple to an in-memory buffer. A background
+thread formats the buffered records as JSON lines and writes them out in
+batches, rotating the file once it grows too big. If the writer falls so
+far behind that the buffer fills up, new records are dropped and counted
+instead of making requests wait.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from threading import Event, Thread
+
+ACCESS_LOG_PATH = "access.log"
+
+# Records waiting to be written, at most
+BUFFER_RECORDS = 8192
+
+# How often (in seconds) the writer wakes up to write what's buffered
+FLUSH_INTERVAL = 0.5
+
+# The log is rotated once it is bigger than `MAX_LOG_BYTES`, keeping
+# `LOG_BACKUPS` old files ("access.log.1" being the newest).
+MAX_LOG_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 3
+
+FIELDS = ("time", "client", "method", "path", "status", "bytes", "duration_ms", "phases_ms")
+
+
+def process_log_path(path, pid=None):
+    """
+    Returns the file a process should log to when several share `path`,
+    e.g. "access.1234.log" for process 1234, so none of them rotates a
+    file another is still writing.
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{extension}"
+
+
+class AccessLog:
+    """
+    Writes one JSON object per request to `path`, with the `FIELDS` above.
+    `phases_ms` breaks the duration down by phase (see
+    `HTTPRequest.timings`).
+
+    `log` never blocks: it appends to a bounded buffer, or counts the record
+    in `dropped` if the buffer is full. Only one process should write to a
+    given `path`, since rotating renames the file.
+    """
+
+    def __init__(self, path=ACCESS_LOG_PATH, capacity=BUFFER_RECORDS,
+                 flush_interval=FLUSH_INTERVAL, max_bytes=MAX_LOG_BYTES,
+                 backups=LOG_BACKUPS):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        # `deque.append` and `popleft` are atomic, so producers never lock
+        self.records = deque()
+        self.dropped = 0
+        self.written = 0
+        self.file = open(path, "a", encoding="utf-8")
+        self.closed = Event()
+        self.writer = Thread(target=self.run, daemon=True)
+        self.writer.start()
+
+    def log(self, client, method, path, status, size, seconds, phases=None):
+        """Buffers the record of one request, or drops it if the buffer is full"""
+        if len(self.records) >= self.capacity:
+            self.dropped += 1
+            return
+        self.records.append((time.time(), client, method, path, status, size, seconds,
+                             phases))
+
+    def run(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Writes out every buffered record. Only the writer thread calls this."""
+        lines = []
+        while True:
+            try:
+                (timestamp, client, method, path, status, size, seconds,
+                 phases) = self.records.popleft()
+            except IndexError:
+                break
+            record = dict(zip(FIELDS, (
+                time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp))
+                + f".{int(timestamp % 1 * 1000):03d}Z",
+                client, method, path, int(status), size, round(seconds * 1000, 3),
+                {phase: round(spent * 1000, 3) for phase, spent in (phases or {}).items()})))
+            lines.append(json.dumps(record, separators=(",", ":")))
+        if not lines:
+            return
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+        self.written += len(lines)
+        if self.file.tell() > self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        """Writes out what's buffered and stops the writer"""
+        self.closed.set()
+        self.writer.join()
+        self.file.close()
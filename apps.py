@@ -0,0 +1,66 @@
+"""
+A small interface for mounting an application on `myServerStudent.py`'s
+engines in place of their own routes.
+
+An application is a callable that takes a request and returns a
+`Response`. The request is the engine's `HTTPRequest`: an application may
+use its `method`, `target`, `path`, `query`, `version`, `headers` (keyed by
+lower case name), `header(name)` and buffered `body`. The engine takes care
+of the connection itself: keep-alive, `Content-Length` or chunked framing,
+and leaving out the body of a HEAD response.
+"""
+
+import importlib
+
+
+class Response:
+    """
+    What an application answers with. `status` is a status line such as
+    "404 NOT FOUND". `body` is bytes, a string (sent as UTF-8), or an
+    iterable of bytes that is streamed to the client as it is produced.
+    A streamed body is sent chunked unless the application gives its
+    `Content-Length`, and has its `close` method called, if any, once sent.
+    """
+
+    def __init__(self, status="200 OK", headers=None, body=b""):
+        self.status = status
+        self.headers = dict(headers or {})
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.body = body
+
+    @property
+    def streaming(self):
+        return not isinstance(self.body, (bytes, bytearray, memoryview))
+
+
+class HandleReqApp:
+    """
+    Adapts an application written as `handle_req(url, body)`, like the one
+    in "server.py", to the interface above. `handle_req` gets the request
+    target and, for a POST, the body decoded as UTF-8 (`None` otherwise),
+    and returns the `(content, content_type)` to answer with.
+    """
+
+    METHODS = ("GET", "HEAD", "POST")
+
+    def __init__(self, handle_req):
+        self.handle_req = handle_req
+
+    def __call__(self, request):
+        if request.method not in self.METHODS:
+            return Response("405 METHOD NOT ALLOWED", {"Allow": ", ".join(self.METHODS)})
+        body = request.body.decode("utf-8") if request.method == "POST" else None
+        content, content_type = self.handle_req(request.target, body)
+        # The same headers "server.py" sends with everything
+        return Response("200 OK", {"Content-Type": content_type,
+                                   "X-Content-Type-Options": "nosniff"},
+                        content)
+
+
+def load(spec):
+    """Returns the object named by `spec`, written as "module:name" """
+    module_name, sep, name = spec.partition(":")
+    if not sep or not module_name or not name:
+        raise ValueError(f"{spec!r} isn't of the form module:name")
+    return getattr(importlib.import_module(module_name), name)
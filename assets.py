@@ -0,0 +1,341 @@
+"""
+The asset pipeline: bundles each page's stylesheets and scripts into as
+few minified files as possible, named after a hash of their contents.
+
+Since a bundle's URL changes whenever its contents do, browsers may keep
+it forever (see `IMMUTABLE_CACHE_CONTROL`), and a page only needs to be
+revalidated to pick up new assets. The pages in "static/html" are copied
+to "static/assets/html" with their `<link>` and `<script>` tags pointing at
+the bundles, leaving the originals to be edited as before.
+
+Run `python assets.py` to build, or start `myServerStudent.py` with
+`--assets` to build at startup and serve the built pages.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+from argparse import ArgumentParser
+
+STATIC_DIR = "static"
+PAGE_DIR = os.path.join(STATIC_DIR, "html")
+
+# Bundles are written here, and served at "/assets/<name>"
+ASSET_DIR = os.path.join(STATIC_DIR, "assets")
+ASSET_URL = "/assets/"
+ASSET_PAGE_DIR = os.path.join(ASSET_DIR, "html")
+
+# Bundles are named "<name>.<hash>.css" (or ".js"), where the hash is the
+# start of the SHA-256 of their contents.
+HASH_LENGTH = 16
+HASHED_ASSET = re.compile(r"\.[0-9a-f]{%d}\.(css|js)$" % HASH_LENGTH)
+
+# A year, the longest `max-age` browsers honour
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# The tags that pull in a local stylesheet or script. Only tags without
+# other attributes are bundled, since `async`, `defer`, `media` and the
+# like would mean something different for the whole bundle.
+ASSET_TAGS = {
+    "css": re.compile(r'<link\s+rel="stylesheet"\s+href="(/[^/"][^"]*\.css)"\s*/?>'),
+    "js": re.compile(r'<script\s+src="(/[^/"][^"]*\.js)"\s*>\s*</script>'),
+}
+
+# Characters after which a "/" starts a regular expression rather than a
+# division, as do these keywords
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^\n")
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+                  "void", "throw", "instanceof", "yield", "await"}
+
+
+def is_hashed_asset(path):
+    """Returns `True` if `path` is a bundle whose contents never change"""
+    return HASHED_ASSET.search(path) is not None
+
+
+def is_word_char(c):
+    return c.isalnum() or c in "_$\\" or ord(c) > 127
+
+
+def skip_space(source, i, line_comments):
+    """
+    Skips the whitespace and comments starting at `i`. Returns where they
+    end and whether they spanned a line break.
+    """
+    newline = False
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c.isspace():
+            newline = newline or c == "\n"
+            i += 1
+        elif source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            newline = newline or "\n" in source[i:end]
+            i = end
+        elif line_comments and source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end == -1 else end
+        else:
+            break
+    return i, newline
+
+
+def scan_string(source, i, quote):
+    """Returns where the string literal starting at `i` ends"""
+    n = len(source)
+    i += 1
+    while i < n and source[i] != quote:
+        i += 2 if source[i] == "\\" else 1
+    return min(i + 1, n)
+
+
+def scan_regex(source, i):
+    """Returns where the regular expression literal starting at `i` ends"""
+    n = len(source)
+    i += 1
+    in_class = False
+    while i < n:
+        c = source[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "[":
+            in_class = True
+        elif c == "]":
+            in_class = False
+        elif c == "/" and not in_class:
+            return i + 1
+        elif c == "\n":
+            break
+        i += 1
+    return i
+
+
+def minify_js(source):
+    """
+    Removes the comments and indentation from a script. Line breaks are
+    kept, so statements that rely on automatic semicolon insertion still
+    end where they did, and strings, template literals and regular
+    expressions are copied untouched.
+    """
+    out = []
+    prev = ""        # the last character written
+    last_word = ""   # the last identifier or keyword written
+    # "`" while in the text of a template literal, "${" while in one of its
+    # substitutions and "{" for any other open brace
+    stack = []
+    i, n = 0, len(source)
+    while i < n:
+        if stack and stack[-1] == "`":
+            j = i
+            while j < n and source[j] != "`" and not source.startswith("${", j):
+                j += 2 if source[j] == "\\" else 1
+            out.append(source[i:j])
+            if source.startswith("${", j):
+                out.append("${")
+                stack.append("${")
+                prev, i = "{", j + 2
+            else:
+                out.append("`")
+                stack.pop()
+                prev, i = "`", j + 1
+            last_word = ""
+            continue
+
+        j, newline = skip_space(source, i, line_comments=True)
+        if j > i:
+            i = j
+            if i >= n or not out:
+                continue
+            c = source[i]
+            if newline and prev != "\n":
+                out.append("\n")
+                prev = "\n"
+            elif (not newline and is_word_char(prev) and is_word_char(c)) or \
+                    (prev == c and c in "+-"):
+                out.append(" ")
+                prev = " "
+            continue
+
+        c = source[i]
+        if c in "'\"":
+            j = scan_string(source, i, c)
+        elif c == "`":
+            stack.append("`")
+            j = i + 1
+        elif c == "/" and (not prev or prev in REGEX_PRECEDERS or last_word in REGEX_KEYWORDS):
+            j = scan_regex(source, i)
+        elif is_word_char(c):
+            j = i
+            while j < n and is_word_char(source[j]):
+                j += 1
+            last_word = source[i:j]
+            out.append(last_word)
+            prev, i = source[j - 1], j
+            continue
+        else:
+            if c == "{":
+                stack.append("{")
+            elif c == "}" and stack:
+                if stack.pop() == "${":
+                    out.append("}")
+                    prev, i = "}", i + 1
+                    continue
+            j = i + 1
+        out.append(source[i:j])
+        prev = source[j - 1]
+        last_word = ""
+        i = j
+    return "".join(out).strip() + "\n"
+
+
+def minify_css(source):
+    """
+    Removes the comments and extra whitespace from a stylesheet, keeping
+    strings and the spaces that separate values (e.g. in `calc(1px + 2px)`).
+    """
+    out = []
+    i, n = 0, len(source)
+    while i < n:
+        j, _ = skip_space(source, i, line_comments=False)
+        if j > i:
+            i = j
+            if i < n and out and out[-1][-1] not in "{};,>" and source[i] not in "{};,>!":
+                out.append(" ")
+            continue
+        c = source[i]
+        if c in "'\"":
+            j = scan_string(source, i, c)
+        else:
+            j = i + 1
+        if c == "}" and out and out[-1] == ";":
+            out.pop()
+        elif c in "{};,>" and out and out[-1] == " ":
+            out.pop()
+        out.append(source[i:j])
+        i = j
+    return "".join(out) + "\n"
+
+
+MINIFIERS = {"css": minify_css, "js": minify_js}
+
+# Put between bundled files, so one that doesn't end its last statement
+# can't run into the next
+SEPARATORS = {"css": "\n", "js": ";\n"}
+
+
+def url_to_path(url, static_dir=STATIC_DIR):
+    """Returns the file under `static_dir` a local asset URL points at"""
+    return os.path.join(static_dir, *url.lstrip("/").split("/"))
+
+
+def build_bundle(kind, urls, static_dir=STATIC_DIR):
+    """
+    Returns the name and contents of the bundle of the assets at `urls`,
+    minifying those that aren't already (".min.js" files).
+    """
+    parts = []
+    for url in urls:
+        with open(url_to_path(url, static_dir), encoding="utf-8") as f:
+            source = f.read()
+        if not url.endswith(f".min.{kind}"):
+            source = MINIFIERS[kind](source)
+        parts.append(source.strip())
+    contents = (SEPARATORS[kind].join(parts) + "\n").encode("utf-8")
+    digest = hashlib.sha256(contents).hexdigest()[:HASH_LENGTH]
+    if len(urls) == 1:
+        stem = os.path.basename(urls[0]).removesuffix(f".{kind}").removesuffix(".min")
+    else:
+        stem = "bundle"
+    return f"{stem}.{digest}.{kind}", contents
+
+
+def find_runs(html, kind):
+    """
+    Returns the runs of `kind` tags in `html` that can be bundled: tags
+    next to each other with nothing but whitespace between them, each
+    given as a list of `(start, end, url)`.
+    """
+    runs = []
+    for match in ASSET_TAGS[kind].finditer(html):
+        tag = (match.start(), match.end(), match.group(1))
+        if runs and not html[runs[-1][-1][1]:match.start()].strip():
+            runs[-1].append(tag)
+        else:
+            runs.append([tag])
+    return runs
+
+
+def write_file(path, contents):
+    # Write to a temporary file first so a running server never serves half of one
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(contents)
+    os.replace(temporary, path)
+
+
+def build(static_dir=STATIC_DIR, page_dir=PAGE_DIR, asset_dir=ASSET_DIR,
+          asset_page_dir=ASSET_PAGE_DIR):
+    """
+    Bundles the assets of every page in `page_dir` into `asset_dir` and
+    writes the rewritten pages to `asset_page_dir`. Bundles left over from
+    earlier builds are removed. Returns the `{bundle name: size}` built.
+    """
+    os.makedirs(asset_page_dir, exist_ok=True)
+    bundles = {}
+    for page in sorted(os.listdir(page_dir)):
+        if not page.endswith(".html"):
+            continue
+        with open(os.path.join(page_dir, page), encoding="utf-8") as f:
+            html = f.read()
+
+        # (start, end, replacement) for every tag to change, applied last
+        # to first so the offsets stay right
+        edits = []
+        for kind in ASSET_TAGS:
+            for run in find_runs(html, kind):
+                urls = [url for _, _, url in run]
+                if not all(os.path.isfile(url_to_path(url, static_dir)) for url in urls):
+                    continue
+                name, contents = build_bundle(kind, urls, static_dir)
+                if name not in bundles:
+                    write_file(os.path.join(asset_dir, name), contents)
+                    bundles[name] = len(contents)
+                start, end, url = run[0]
+                edits.append((start, end, html[start:end].replace(url, ASSET_URL + name)))
+                edits.extend((start, end, "") for start, end, _ in run[1:])
+
+        for start, end, replacement in sorted(edits, reverse=True):
+            line_start = html.rfind("\n", 0, start)
+            if not replacement and line_start >= 0 and not html[line_start + 1:start].strip():
+                # A removed tag takes its line with it
+                start = line_start
+            html = html[:start] + replacement + html[end:]
+        built_page = os.path.join(asset_page_dir, page)
+        write_file(built_page, html.encode("utf-8"))
+        # Keep the permissions, so a page others can't read stays forbidden
+        shutil.copymode(os.path.join(page_dir, page), built_page)
+
+    for name in os.listdir(asset_dir):
+        if is_hashed_asset(name) and name not in bundles:
+            os.remove(os.path.join(asset_dir, name))
+    return bundles
+
+
+def main():
+    parser = ArgumentParser(description="Bundle and minify the pages' CSS and JavaScript")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+    static_dir = args.static_dir
+    bundles = build(static_dir, os.path.join(static_dir, "html"),
+                    os.path.join(static_dir, "assets"),
+                    os.path.join(static_dir, "assets", "html"))
+    for name, size in sorted(bundles.items()):
+        print(f"{ASSET_URL}{name} ({size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+A load-testing harness for the two servers in this repository.
+
+It starts `myServerStudent.py` (with any engine) or `server.py` in a child
+process, drives it from a concurrent asyncio client over real sockets, and
+reports throughput, latency percentiles, errors and the server's memory use
+as JSON. For example:
+
+    python bench.py --server myServerStudent --engine asyncio -o after.json
+    python bench.py --server myServerStudent --compare before.json
+
+Everything runs locally; nothing outside this directory is needed. The
+client is a single event loop, so results are best used to compare runs
+on the same machine rather than as absolute numbers.
+"""
+
+import asyncio
+import json
+import os
+import platform
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+HOST = "127.0.0.1"
+
+# `server.py` always listens on this port
+SERVER_PY_PORT = 8000
+
+EVENT_BODY = ("event=Benchmark&day=Monday&start=09%3A00&end=10%3A00"
+              "&phone=123-456-7890&location=Keller+Hall&url=https%3A%2F%2Fexample.com")
+
+# name: (method, paths on myServerStudent.py, paths on server.py, body). The
+# paths of a workload are requested in turn. Workloads a server has no
+# route for are skipped for it.
+WORKLOADS = {
+    "small_html": ("GET", ["/html/index.html"], ["/html/index.html"], None),
+    "styles_css": ("GET", ["/css/styles.css"], ["/css/styles.css"], None),
+    "jquery": ("GET", ["/js/jquery-3.7.1.min.js"], ["/js/jquery-3.7.1.min.js"], None),
+    "large_jpeg": ("GET", ["/img/walter.jpg", "/img/home.jpg", "/img/recwell.jpg"],
+                   ["/img/walter.jpg", "/img/home.jpg", "/img/recwell.jpg"], None),
+    "mp3": ("GET", ["/mp3/OuttaSpace.mp3"], ["/mp3/OuttaSpace.mp3"], None),
+    "not_found": ("GET", ["/no-such-page"], ["/no-such-page"], None),
+    "post_eventlog": ("POST", ["/EventLog"], ["/html/EventLog.html"], EVENT_BODY),
+    "redirect": ("GET", ["/redirect?query_string=csci+4131"], None, None),
+}
+
+DEFAULT_CONCURRENCY = "1,8,32"
+DEFAULT_DURATION = 3.0
+DEFAULT_WARMUP = 0.5
+
+# A request that takes longer than this counts as an error
+REQUEST_TIMEOUT = 10
+
+# How long to wait for a freshly started server to accept connections
+STARTUP_TIMEOUT = 10
+
+
+def build_request(method, path, body, keep_alive):
+    headers = [f"{method} {path} HTTP/1.1", f"Host: {HOST}"]
+    if not keep_alive:
+        headers.append("Connection: close")
+    payload = b""
+    if body is not None:
+        payload = body.encode("utf-8")
+        headers.append("Content-Type: application/x-www-form-urlencoded")
+        headers.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload
+
+
+async def read_response(reader, method):
+    """Reads one response, returning `(status, bytes read, server closes)`"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = 0 if method == "HEAD" else int(headers.get("content-length", 0))
+    remaining = length
+    while remaining:
+        chunk = await reader.read(min(remaining, 256 * 1024))
+        if not chunk:
+            raise asyncio.IncompleteReadError(b"", remaining)
+        remaining -= len(chunk)
+    return status, len(head) + length, headers.get("connection", "").lower() == "close"
+
+
+class Cell:
+    """The results of one workload at one concurrency"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.bytes = 0
+
+
+async def client(port, method, requests, keep_alive, deadline, cell):
+    """Sends `requests` in turn until `deadline`, recording each into `cell`"""
+    reader = writer = None
+    i = 0
+    while time.monotonic() < deadline:
+        request = requests[i % len(requests)]
+        i += 1
+        start = time.perf_counter()
+        reused = writer is not None
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(HOST, port)
+            writer.write(request)
+            status, size, closes = await asyncio.wait_for(read_response(reader, method),
+                                                          REQUEST_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError,
+                asyncio.LimitOverrunError, ValueError, IndexError) as error:
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            # A server may close an idle persistent connection at any time;
+            # that is only an error if a fresh connection fails too.
+            if reused and isinstance(error, (asyncio.IncompleteReadError, ConnectionError)):
+                i -= 1
+                continue
+            cell.errors += 1
+            continue
+
+        cell.latencies.append(time.perf_counter() - start)
+        cell.statuses[status] = cell.statuses.get(status, 0) + 1
+        cell.bytes += size
+        if status >= 500:
+            cell.errors += 1
+        if closes or not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, method, requests, keep_alive, concurrency, duration):
+    cell = Cell()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(client(port, method, requests, keep_alive, deadline, cell)
+                           for _ in range(concurrency)))
+    return cell
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def read_rss(pid):
+    """Returns the resident and peak memory (in KiB) of process `pid`, if known"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+    except OSError:
+        return None, None
+    return (int(fields["VmRSS"].split()[0]) if "VmRSS" in fields else None,
+            int(fields["VmHWM"].split()[0]) if "VmHWM" in fields else None)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(port, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            socket.create_connection((HOST, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server didn't start listening on port {port}")
+
+
+def start_server(args, scratch):
+    """Starts the server under test, returning `(process, port)`"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    if args.server == "server":
+        port = SERVER_PY_PORT
+        command = [sys.executable, "server.py"]
+    else:
+        port = free_port()
+        command = [sys.executable, "myServerStudent.py", "--host", HOST, "--port", str(port),
+                   "--engine", args.engine,
+                   "--event-log", os.path.join(scratch, "events.log"),
+                   "--access-log", os.path.join(scratch, "access.log")]
+    command += shlex.split(args.server_args)
+    process = subprocess.Popen(command, cwd=root, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        wait_until_listening(port, process)
+    except RuntimeError:
+        process.kill()
+        process.wait()
+        raise
+    return process, port
+
+
+def run_cell(port, pid, name, concurrency, keep_alive, args):
+    method, student_paths, server_paths, body = WORKLOADS[name]
+    paths = server_paths if args.server == "server" else student_paths
+    requests = [build_request(method, path, body, keep_alive) for path in paths]
+    if args.warmup:
+        asyncio.run(drive(port, method, requests, keep_alive, concurrency, args.warmup))
+    started = time.perf_counter()
+    cell = asyncio.run(drive(port, method, requests, keep_alive, concurrency, args.duration))
+    elapsed = time.perf_counter() - started
+    rss, peak_rss = read_rss(pid)
+
+    latencies = sorted(cell.latencies)
+    to_ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {"workload": name, "concurrency": concurrency, "keep_alive": keep_alive,
+            "requests": len(latencies), "errors": cell.errors,
+            "statuses": {str(status): n for status, n in sorted(cell.statuses.items())},
+            "requests_per_second": round(len(latencies) / elapsed, 1),
+            "bytes_per_second": round(cell.bytes / elapsed),
+            "latency_ms": {"p50": to_ms(percentile(latencies, 0.50)),
+                           "p95": to_ms(percentile(latencies, 0.95)),
+                           "p99": to_ms(percentile(latencies, 0.99)),
+                           "max": to_ms(latencies[-1] if latencies else None)},
+            "server_rss_kb": rss, "server_peak_rss_kb": peak_rss}
+
+
+def run(args):
+    workloads = args.workloads.split(",") if args.workloads else list(WORKLOADS)
+    concurrencies = [int(n) for n in args.concurrency.split(",")]
+    keep_alive_modes = {"on": [True], "off": [False], "both": [True, False]}[args.keep_alive]
+
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        process, port = start_server(args, scratch)
+        try:
+            for name in workloads:
+                server_paths = WORKLOADS[name][2 if args.server == "server" else 1]
+                if server_paths is None:
+                    print(f"skipping {name}: no route on {args.server}.py", file=sys.stderr)
+                    continue
+                for keep_alive in keep_alive_modes:
+                    for concurrency in concurrencies:
+                        result = run_cell(port, process.pid, name, concurrency, keep_alive, args)
+                        print(f"{name:14} c={concurrency:<4} keep-alive={'on ' if keep_alive else 'off'}"
+                              f" {result['requests_per_second']:>9} req/s"
+                              f" p99={result['latency_ms']['p99']} ms errors={result['errors']}",
+                              file=sys.stderr)
+                        results.append(result)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    return {"server": args.server,
+            "engine": args.engine if args.server == "myServerStudent" else None,
+            "server_args": args.server_args,
+            "duration": args.duration,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "results": results}
+
+
+def compare(report, baseline):
+    """Returns how each cell changed against the matching cell of `baseline`"""
+    key = lambda r: (r["workload"], r["concurrency"], r["keep_alive"])
+    before = {key(r): r for r in baseline["results"]}
+    changes = []
+    for result in report["results"]:
+        old = before.get(key(result))
+        if old is None or not old["requests_per_second"]:
+            continue
+        change = {"workload": result["workload"], "concurrency": result["concurrency"],
+                  "keep_alive": result["keep_alive"],
+                  "requests_per_second": round(result["requests_per_second"]
+                                               / old["requests_per_second"], 3)}
+        if old["latency_ms"]["p99"] and result["latency_ms"]["p99"] is not None:
+            change["p99"] = round(result["latency_ms"]["p99"] / old["latency_ms"]["p99"], 3)
+        changes.append(change)
+    return changes
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the homework servers")
+    parser.add_argument("--server", choices=("myServerStudent", "server"),
+                        default="myServerStudent")
+    parser.add_argument("--engine", choices=("threaded", "asyncio"), default="threaded",
+                        help="engine to run myServerStudent.py with")
+    parser.add_argument("--server-args", default="",
+                        help='extra arguments for the server, e.g. "--workers 64"')
+    parser.add_argument("--workloads", help=f"comma-separated subset of {', '.join(WORKLOADS)}")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY,
+                        help="comma-separated numbers of concurrent clients")
+    parser.add_argument("--keep-alive", choices=("on", "off", "both"), default="both")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                        help="seconds to measure each combination for")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP,
+                        help="seconds to run each combination before measuring")
+    parser.add_argument("-o", "--output", help="file to write the JSON report to")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            report["compared_to"] = args.compare
+            report["ratios"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
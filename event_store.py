@@ -0,0 +1,370 @@
+"""
+A persistent store for the events submitted through "myform.html".
+
+Events are appended to a log file, one JSON object per line, and never
+rewritten. On startup the log is read once to rebuild in-memory indexes by
+day and by start time, so queries never have to scan the file again.
+
+Only one process may write the log at a time: a store holds an exclusive
+lock on it while open. A server being replaced on restart hands the log
+over (see `EventStore.hand_over`) so the new one indexes every event.
+"""
+
+import fcntl
+import json
+import os
+import re
+from collections import defaultdict
+from threading import Event, Lock, Thread
+from urllib.parse import parse_qsl, urlsplit
+
+# The fields submitted by the event form in "myform.html", in table order
+EVENT_FIELDS = ("event", "day", "start", "end", "phone", "location", "url")
+
+# The days the form offers, in the order events are listed
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Appended events are written to disk with `fsync` once this many are
+# waiting, or after `FSYNC_INTERVAL` seconds, whichever comes first.
+FSYNC_BATCH = 64
+FSYNC_INTERVAL = 1.0
+
+# What "myform.html" accepts for the fields it checks
+MAX_EVENT_NAME = 100
+PHONE_PATTERN = re.compile(r"[0-9]{3}-[0-9]{3}-[0-9]{4}")
+URL_SCHEMES = {"http", "https"}
+
+
+class StoreClosed(Exception):
+    """Raised for an event appended after the store handed its log over"""
+
+
+class StoreLocked(Exception):
+    """Raised when another process is already writing the log"""
+
+
+def normalize_day(day):
+    """Returns `day` capitalized like `DAYS` ("monday" -> "Monday")"""
+    return day.strip().capitalize()
+
+
+def minute_of_day(time_of_day):
+    """
+    Returns the minute of the day for an "HH:MM" (or "HH:MM:SS") time, or
+    `None` if it isn't a valid time.
+    """
+    try:
+        hours, minutes = time_of_day.split(":")[:2]
+        hours, minutes = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def validate_event(event):
+    """
+    Returns a list of the reasons `event` isn't something "myform.html"
+    would submit, which is empty if it is.
+    """
+    missing = [field for field in EVENT_FIELDS
+               if not isinstance(event.get(field), str) or not event[field].strip()]
+    if missing:
+        return [f"{field} is missing" for field in missing]
+
+    errors = []
+    if len(event["event"]) > MAX_EVENT_NAME:
+        errors.append(f"event must be at most {MAX_EVENT_NAME} characters")
+    if normalize_day(event["day"]) not in DAYS:
+        errors.append("day must be one of Monday to Sunday")
+    for field in ("start", "end"):
+        if minute_of_day(event[field]) is None:
+            errors.append(f"{field} must be a time like 09:30")
+    if not PHONE_PATTERN.fullmatch(event["phone"]):
+        errors.append("phone must look like 123-456-7890")
+    try:
+        scheme = urlsplit(event["url"].strip()).scheme.lower()
+    except ValueError:
+        scheme = ""
+    if scheme not in URL_SCHEMES:
+        errors.append("url must be an http or https URL")
+    return errors
+
+
+class EventStore:
+    """
+    An append-only event log at `path` with indexes for finding events by
+    day and start time.
+
+    Each event is kept in memory as a tuple of its `EVENT_FIELDS`, and its
+    id is its position in the log. `by_day` maps each day to a dictionary of
+    buckets keyed by the minute of the day the events start at, so appending
+    an event is a constant time operation and a query only visits the
+    buckets in its time window.
+
+    If another process holds the log, `on_locked` is called and the store
+    waits for it to be handed over, or `StoreLocked` is raised if there is
+    no `on_locked`.
+    """
+
+    def __init__(self, path, fsync_batch=FSYNC_BATCH, fsync_interval=FSYNC_INTERVAL,
+                 on_locked=None):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.lock = Lock()
+        self.handed_over = False
+        self.open_log(on_locked)
+        self.pending = 0
+        self.closed = Event()
+        self.flusher = Thread(target=self.flush_periodically, args=(fsync_interval,),
+                              daemon=True)
+        self.flusher.start()
+
+    def open_log(self, on_locked=None):
+        # Callers must hold `self.lock` (or be the constructor)
+        self.log = open(self.path, "a", encoding="utf-8")
+        try:
+            fcntl.flock(self.log, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if on_locked is None:
+                self.log.close()
+                raise StoreLocked(f"{self.path} is in use by another process")
+            on_locked()
+            fcntl.flock(self.log, fcntl.LOCK_EX)
+        # Only read once nobody else can add to it
+        self.events = []
+        self.by_day = defaultdict(lambda: defaultdict(list))
+        self.load()
+
+    def hand_over(self):
+        """
+        Writes out what's pending and releases the log for another process
+        to take over. Appending afterwards raises `StoreClosed`; queries
+        still answer from the events stored so far.
+        """
+        with self.lock:
+            if self.handed_over:
+                return
+            self.sync()
+            self.log.close()
+            self.handed_over = True
+
+    def take_back(self):
+        """Reopens a log that was handed over, reindexing what's in it now"""
+        with self.lock:
+            if self.handed_over:
+                self.open_log()
+                self.handed_over = False
+
+    def load(self):
+        """
+        Rebuilds the indexes from the log. A torn last line, left by a crash
+        in the middle of a write, is cut off so the next append starts on a
+        line of its own.
+        """
+        try:
+            with open(self.path, "rb+") as f:
+                end = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    try:
+                        self.index(json.loads(line))
+                    except (ValueError, AttributeError):
+                        continue
+                if end < os.fstat(f.fileno()).st_size:
+                    f.truncate(end)
+        except FileNotFoundError:
+            pass
+
+    def index(self, event):
+        # Callers must hold `self.lock` (or be the constructor)
+        record = tuple(str(event.get(field, "")) for field in EVENT_FIELDS)
+        event_id = len(self.events)
+        self.events.append(record)
+        day = normalize_day(record[1])
+        start = minute_of_day(record[2])
+        self.by_day[day][-1 if start is None else start].append(event_id)
+        return event_id
+
+    def append(self, event):
+        """Stores `event`, a dictionary of `EVENT_FIELDS`, returning its id"""
+        record = {field: str(event.get(field, "")) for field in EVENT_FIELDS}
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.handed_over:
+                raise StoreClosed(f"{self.path} was handed over to another process")
+            event_id = self.index(record)
+            self.log.write(line)
+            self.pending += 1
+            if self.pending >= self.fsync_batch:
+                self.sync()
+        return event_id
+
+    def sync(self):
+        # Callers must hold `self.lock`
+        if self.pending and not self.handed_over:
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.pending = 0
+
+    def flush_periodically(self, interval):
+        while not self.closed.wait(interval):
+            with self.lock:
+                self.sync()
+
+    def close(self):
+        self.closed.set()
+        with self.lock:
+            self.sync()
+            if not self.handed_over:
+                self.log.close()
+
+    def event(self, event_id):
+        return {"id": event_id, **dict(zip(EVENT_FIELDS, self.events[event_id]))}
+
+    def query(self, day=None, start_from=None, start_to=None, offset=0, limit=50):
+        """
+        Returns `(total, events)`: how many events match, and the `limit`
+        matching events after the first `offset`, ordered by day and then
+        start time. `start_from` and `start_to` are inclusive minutes of
+        the day; events without a valid start time never match them.
+        """
+        with self.lock:
+            if day is not None:
+                days = [normalize_day(day)]
+            else:
+                days = [d for d in DAYS if d in self.by_day]
+                days += sorted(d for d in self.by_day if d not in DAYS)
+
+            buckets = []
+            for d in days:
+                starts = self.by_day.get(d, {})
+                for start in sorted(starts):
+                    if start_from is not None and (start < 0 or start < start_from):
+                        continue
+                    if start_to is not None and (start < 0 or start > start_to):
+                        continue
+                    buckets.append(starts[start])
+
+            total = sum(map(len, buckets))
+            page = []
+            for ids in buckets:
+                if offset >= len(ids):
+                    offset -= len(ids)
+                    continue
+                page.extend(ids[offset:offset + limit - len(page)])
+                offset = 0
+                if len(page) >= limit:
+                    break
+            return total, [self.event(event_id) for event_id in page]
+
+    def __len__(self):
+        return len(self.events)
+
+
+class BulkIngest:
+    """
+    Stores the events in a bulk upload to `store` as the body arrives, one
+    record per line. Records are JSON objects ("application/x-ndjson") or
+    urlencoded forms ("application/x-www-form-urlencoded"); with any other
+    content type each line is read as JSON if it starts with "{".
+
+    Only the line being read is kept in memory, plus the first
+    `MAX_ERRORS` errors, so a body of any size is ingested in constant
+    memory. Valid records are stored as soon as their line ends.
+    """
+
+    # Lines longer than this are rejected without being buffered
+    MAX_LINE = 64 * 1024
+    # Only this many rejected lines are described in the summary
+    MAX_ERRORS = 100
+
+    def __init__(self, store, content_type=None):
+        self.store = store
+        content_type = (content_type or "").lower()
+        if "json" in content_type:
+            self.format = "json"
+        elif "urlencoded" in content_type:
+            self.format = "form"
+        else:
+            self.format = None
+        self.line = bytearray()
+        self.too_long = False
+        self.line_number = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+        # Set if the store was handed over partway through the upload
+        self.store_closed = False
+
+    def feed(self, data):
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                break
+            self.append_to_line(data[start:end])
+            self.end_line()
+            start = end + 1
+        self.append_to_line(data[start:])
+
+    def close(self):
+        """Ingests the last line, which may not end with a newline"""
+        if self.line or self.too_long:
+            self.end_line()
+
+    def append_to_line(self, data):
+        if self.too_long:
+            return
+        self.line += data
+        if len(self.line) > self.MAX_LINE:
+            self.too_long = True
+            self.line.clear()
+
+    def end_line(self):
+        self.line_number += 1
+        line, self.line = bytes(self.line).strip(), bytearray()
+        if self.too_long:
+            self.too_long = False
+            self.reject([f"line is longer than {self.MAX_LINE} bytes"])
+        elif line:
+            self.ingest(line)
+
+    def ingest(self, line):
+        try:
+            text = line.decode("utf-8")
+            if self.format == "json" or (self.format is None and text.startswith("{")):
+                event = json.loads(text)
+                if not isinstance(event, dict):
+                    raise ValueError("record must be a JSON object")
+            else:
+                event = dict(parse_qsl(text, keep_blank_values=True))
+        except ValueError as error:
+            self.reject([f"unreadable record: {error}"])
+            return
+        errors = validate_event(event)
+        if errors:
+            self.reject(errors)
+        elif self.store_closed:
+            self.reject(["the event log is closed; send this record again"])
+        else:
+            try:
+                self.store.append(event)
+            except StoreClosed:
+                self.store_closed = True
+                self.reject(["the event log is closed; send this record again"])
+                return
+            self.accepted += 1
+
+    def reject(self, errors):
+        self.rejected += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({"line": self.line_number, "errors": errors})
+
+    def summary(self):
+        return {"accepted": self.accepted, "rejected": self.rejected,
+                "errors": self.errors,
+                "errors_truncated": self.rejected > len(self.errors)}
@@ -0,0 +1,182 @@
+"""
+Request metrics for `myServerStudent.py`, exposed in the Prometheus text
+format at "/metrics".
+
+Recording a request must be cheap enough to leave on all the time, so
+each thread counts into its own shard without taking a lock, and the
+shards are only added up when "/metrics" is scraped.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Shards of finished threads are folded together once there are this many,
+# so starting a thread per connection doesn't grow the list forever.
+MAX_SHARDS = 256
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Series:
+    """The requests recorded for one route, method and status"""
+
+    __slots__ = ("count", "seconds", "bytes", "buckets")
+
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        # One count per bucket, plus one for slower requests ("+Inf")
+        self.buckets = [0] * (bucket_count + 1)
+
+    def add(self, other):
+        self.count += other.count
+        self.seconds += other.seconds
+        self.bytes += other.bytes
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """
+    Counts requests by route, method and status, with a latency histogram
+    using the fixed `buckets`, and collects any other values registered
+    with `register` when rendered.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # `(thread, shard)` pairs, where a shard maps (route, method, status)
+        # to the `Series` that thread recorded
+        self.shards = []
+        self.retired = {}
+        self.collectors = []
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = {}
+            with self.lock:
+                if len(self.shards) >= MAX_SHARDS:
+                    self.retire_finished()
+                self.shards.append((threading.current_thread(), shard))
+            return shard
+
+    def observe(self, route, method, status, seconds, size):
+        """Records a request answered with `status` in `seconds`, sending `size` bytes"""
+        shard = self.shard()
+        key = (route, method, status)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = Series(len(self.buckets))
+        series.count += 1
+        series.seconds += seconds
+        series.bytes += size
+        series.buckets[bisect_left(self.buckets, seconds)] += 1
+
+    def retire_finished(self):
+        # Callers must hold `self.lock`. A finished thread won't touch its
+        # shard again, so it can be folded into `retired` safely.
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self.merge(self.retired, shard)
+        self.shards = live
+
+    def merge(self, totals, shard):
+        # `copy` is atomic, whereas iterating a shard its thread is adding
+        # to could fail
+        for key, series in shard.copy().items():
+            total = totals.get(key)
+            if total is None:
+                total = totals[key] = Series(len(self.buckets))
+            total.add(series)
+
+    def register(self, name, kind, help_text, collect):
+        """
+        Adds a metric of `kind` ("counter" or "gauge") to the output. When
+        rendered, `collect()` returns its value, or a list of
+        `(labels, value)` pairs for a metric with labels.
+        """
+        self.collectors.append((name, kind, help_text, collect))
+
+    def totals(self):
+        with self.lock:
+            self.retire_finished()
+            totals = {}
+            self.merge(totals, self.retired)
+            for _, shard in self.shards:
+                self.merge(totals, shard)
+        return totals
+
+    def render(self):
+        """Returns every metric in the Prometheus text format"""
+        totals = self.totals()
+        lines = []
+
+        lines.append("# HELP http_requests_total Requests answered, by route, method and status.")
+        lines.append("# TYPE http_requests_total counter")
+        for (route, method, status), series in sorted(totals.items()):
+            labels = format_labels({"route": route, "method": method, "status": status})
+            lines.append(f"http_requests_total{labels} {series.count}")
+
+        lines.append("# HELP http_response_bytes_total Bytes sent in responses, by route and status.")
+        lines.append("# TYPE http_response_bytes_total counter")
+        by_status = {}
+        for (route, _, status), series in totals.items():
+            total = by_status.get((route, status))
+            if total is None:
+                total = by_status[(route, status)] = Series(len(self.buckets))
+            total.add(series)
+        for (route, status), series in sorted(by_status.items()):
+            labels = format_labels({"route": route, "status": status})
+            lines.append(f"http_response_bytes_total{labels} {series.bytes}")
+
+        lines.append("# HELP http_request_duration_seconds Time to build and send a response.")
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for (route, status), series in sorted(by_status.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), series.buckets):
+                cumulative += n
+                labels = format_labels({"route": route, "status": status, "le": bound})
+                lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = format_labels({"route": route, "status": status})
+            lines.append(f"http_request_duration_seconds_sum{labels} {series.seconds}")
+            lines.append(f"http_request_duration_seconds_count{labels} {series.count}")
+
+        for name, kind, help_text, collect in self.collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            values = collect()
+            if not isinstance(values, list):
+                values = [({}, values)]
+            for labels, value in values:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def hit_ratio(hits, misses):
+    """Returns the fraction of lookups that were hits, or 0 before any lookups"""
+    lookups = hits + misses
+    return hits / lookups if lookups else 0.0
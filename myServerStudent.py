@@ -1,15 +1,136 @@
 #!/usr/bin/env python3
 
+import asyncio
+import gzip
+import heapq
+import selectors
 import socket
+import zlib
 import os
+import re
+import select
+import signal
 import stat
-from urllib.parse import unquote
+import subprocess
+import sys
+import time
+import traceback
+from argparse import ArgumentParser
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from secrets import token_hex
+import json
+from urllib.parse import parse_qs, unquote
 
-from threading import Thread
+from queue import Queue, Full
+from threading import Event, Thread, Lock
+
+from access_log import ACCESS_LOG_PATH, AccessLog, process_log_path
+from apps import HandleReqApp, load as load_app
+from assets import (ASSET_DIR, ASSET_PAGE_DIR, IMMUTABLE_CACHE_CONTROL, PAGE_DIR,
+                    build as build_assets, is_hashed_asset)
+from event_store import (BulkIngest, EventStore, StoreClosed, StoreLocked, minute_of_day,
+                         validate_event)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, hit_ratio
+from profiler import DEFAULT_PROFILE_REQUESTS, PROFILE_DIR, RequestProfiler
+from stock_quotes import QuoteCache, UpstreamError, make_upstream, normalize_symbol
+from templates import render_event_page
 
 # Equivalent to CRLF, named NEWLINE for clarity
 NEWLINE = "\r\n"
 
+# The blank line that ends the headers of a request, as raw bytes
+HEADER_TERMINATOR = b"\r\n\r\n"
+
+# Requests with a bigger head or body than these are refused
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+
+# Bodies streamed to a handler as they arrive (see `RequestParser`) are never
+# held in memory, so they may be much bigger.
+MAX_STREAM_BODY_SIZE = 256 * 1024 * 1024
+
+# How long (in seconds) an idle persistent connection is kept open, and how
+# many requests a single connection may make before we close it.
+KEEP_ALIVE_TIMEOUT = 5
+MAX_KEEP_ALIVE_REQUESTS = 100
+
+# Once a client starts sending a request, it has `HEADER_TIMEOUT` seconds to
+# finish the head and then `BODY_TIMEOUT` seconds for the body, or it gets a
+# 408. Sending a response gives up once the client hasn't read anything for
+# `WRITE_TIMEOUT` seconds.
+HEADER_TIMEOUT = 10
+BODY_TIMEOUT = 60
+WRITE_TIMEOUT = 30
+
+# At most `MAX_IN_FLIGHT` connections are served (or wait for a worker) at
+# once, and, when set, at most `MAX_CONNECTIONS_PER_IP` from one address.
+# Any more are answered straight away with a prebuilt 503 (or 429) asking
+# the client to retry after `RETRY_AFTER` seconds. Keep-alive connections
+# waiting for their next request don't count towards `MAX_IN_FLIGHT`; up
+# to `MAX_IDLE_CONNECTIONS` of them are kept open, and any more are closed.
+MAX_IN_FLIGHT = 512
+MAX_IDLE_CONNECTIONS = 1024
+MAX_CONNECTIONS_PER_IP = None
+RETRY_AFTER = 1
+
+# When told to stop, the server stops accepting connections and gives the
+# ones in flight up to `DRAIN_TIMEOUT` seconds to finish. Idle connections
+# notice within `DRAIN_POLL_INTERVAL` seconds.
+DRAIN_TIMEOUT = 30
+DRAIN_POLL_INTERVAL = 0.5
+
+# A restarted server finds the inherited listening socket, and the pipe to
+# say it's ready on, in these environment variables. The old server keeps
+# serving if the new one isn't ready within `RESTART_TIMEOUT` seconds.
+# Before that the new one may ask for the event log (`LOCKED`), which the
+# old one then stops writing to.
+LISTEN_FD_ENV = "MYSERVER_LISTEN_FD"
+READY_FD_ENV = "MYSERVER_READY_FD"
+RESTART_TIMEOUT = 10
+READY = b"1"
+LOCKED = b"e"
+
+# Connections are handed to a fixed number of worker threads through a
+# bounded queue. Once the queue is full, new connections are turned away.
+DEFAULT_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 256
+
+# Built responses for static files are kept in memory, up to this many bytes
+# in total. Files bigger than `MAX_CACHED_FILE_SIZE` are never cached.
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+MAX_CACHED_FILE_SIZE = 1024 * 1024
+
+# Files bigger than this are sent straight from the kernel with `sendfile`
+# instead of being read into memory first.
+SENDFILE_THRESHOLD = 256 * 1024
+
+# Text files smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 512
+
+# How long (in seconds) the result of looking up a path on disk is trusted,
+# and how many lookups are remembered. Paths that don't exist are remembered
+# too, so repeated requests for missing files don't touch the disk.
+PATH_CACHE_TTL = 1.0
+PATH_CACHE_ENTRIES = 4096
+
+# Requests asking for more ranges than this get the whole file instead, so a
+# single request can't make us send thousands of tiny parts.
+MAX_RANGES = 16
+
+# Events posted to "/EventLog" are appended to this file, and listed by
+# "GET /EventLog" a page at a time.
+EVENT_LOG_PATH = "events.log"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Paths counted as their own route in "/metrics". Every other path is
+# counted as "static", so the number of series stays bounded.
+METRIC_ROUTES = {"EventLog", "EventLog/bulk", "api/stocks", "redirect", "metrics",
+                 "admin/profile"}
+METRIC_METHODS = {"GET", "HEAD", "POST"}
+
 
 # Let's define some functions to help us deal with files, since reading them
 # and returning their data is going to be a very common operation.
@@ -144,6 +265,90 @@ mime_types = {
 }
 
 
+# How long browsers may reuse a file before checking back with us, by file
+# extension. Extensions that aren't listed fall back on the policy for their
+# kind of MIME type in `cache_control_by_type` (e.g. "image" for "image/png"),
+# and then on `DEFAULT_CACHE_CONTROL`. HTML must always be revalidated so
+# changes to pages show up immediately.
+cache_control = {
+    "html": "no-cache",
+    "htm": "no-cache",
+}
+
+cache_control_by_type = {
+    "image": "public, max-age=86400",
+    "audio": "public, max-age=86400",
+    "video": "public, max-age=86400",
+    "font": "public, max-age=604800",
+}
+
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+
+def get_cache_control(file_extension):
+    """Returns the `Cache-Control` policy for files with `file_extension`"""
+    if file_extension in cache_control:
+        return cache_control[file_extension]
+    kind = mime_types.get(file_extension, "text/plain").split("/")[0]
+    return cache_control_by_type.get(kind, DEFAULT_CACHE_CONTROL)
+
+
+# Besides "text/*", these MIME types compress well. Files read as binary
+# (see `binary_type_files`) are already compressed and never are.
+compressible_types = {
+    "application/javascript",
+    "application/json",
+    "application/ld+json",
+    "application/xml",
+    "application/xhtml+xml",
+    "image/svg+xml",
+}
+
+# The content codings we can produce, in order of preference, mapped to the
+# function that encodes a body with them. Variants are built once and then
+# cached, so the slowest, best compression level is used.
+content_encoders = {
+    "gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+    "deflate": lambda body: zlib.compress(body, 9),
+}
+
+
+def should_compress(file_extension):
+    """Returns `True` if files with `file_extension` are worth compressing"""
+    if should_return_binary(file_extension):
+        return False
+    mime_type = mime_types.get(file_extension, "text/plain")
+    return mime_type.startswith("text/") or mime_type in compressible_types
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Returns the name of the best encoder in `content_encoders` allowed by an
+    `Accept-Encoding` header, or `None` if the body should be sent as-is.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in content_encoders:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
 def get_file_mime_type(file_extension):
     """
     Returns the MIME type for `file_extension` if present, otherwise
@@ -153,72 +358,1006 @@ def get_file_mime_type(file_extension):
     return mime_type if mime_type is not None else "text/plain"
 
 
+def encode_head(status, headers):
+    """
+    Returns the encoded status line and `headers` of a response, each ending
+    in a newline. The `Connection` header and the blank line that ends the
+    headers are left off so the result can be reused between connections.
+    """
+    lines = [f"HTTP/1.1 {status}"]
+    lines += [f"{key}: {value}" for key, value in headers.items()]
+    return (NEWLINE.join(lines) + NEWLINE).encode("utf-8")
+
+
+def finish_head(head, keep_alive=False):
+    """
+    Completes a `head` from `encode_head` with the `Connection` header and
+    the blank line that separates it from the body. The `Connection` header
+    is added here so every response agrees with how the connection is handled.
+    """
+    if keep_alive:
+        return head + b"Connection: keep-alive\r\n\r\n"
+    return head + b"Connection: close\r\n\r\n"
+
+
+def response_header(status, headers, keep_alive=False):
+    """
+    Returns the encoded status line and `headers` of a response, followed by
+    the blank line that separates them from the body.
+    """
+    return finish_head(encode_head(status, headers), keep_alive)
+
+
+def http_date(timestamp):
+    """Formats a Unix `timestamp` the way HTTP headers expect dates"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def file_etag(file_stat):
+    """
+    Returns a strong entity tag for a file, built from its inode, size and
+    modification time so that it changes whenever the file does.
+    """
+    return f'"{file_stat.st_ino:x}-{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"'
+
+
+def is_not_modified(request, etag, file_stat):
+    """
+    Returns `True` if the client's cached copy, described by its
+    `If-None-Match` or `If-Modified-Since` header, is still current.
+    `If-None-Match` wins when both are sent.
+    """
+    if_none_match = request.header("If-None-Match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, as required for If-None-Match
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.header("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(file_stat.st_mtime) <= since
+    return False
+
+
+def parse_range(range_header, file_size):
+    """
+    Parses a `Range` header into a list of inclusive `(start, end)` byte
+    ranges of a file that is `file_size` bytes long.
+
+    Returns `None` if the header should be ignored (it is malformed, not in
+    bytes, or asks for too many ranges), and an empty list if none of the
+    ranges can be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for item in spec.split(","):
+        first, sep, last = item.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # "-N" means the last N bytes of the file
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(file_size - suffix, 0), file_size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+                if start < 0 or (last and end < start):
+                    return None
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+        if start < file_size:
+            ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+class RequestError(Exception):
+    """
+    Raised for a request we can't or won't parse. `status` is the status of
+    the error response sent back before the connection is closed.
+    """
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class HTTPRequest:
+    """
+    A parsed request. Header names in `headers` are lowercase, and
+    `body` holds the raw bytes of the body (after undoing any chunked
+    transfer coding). If the body was streamed to a `sink` instead, `body`
+    is empty and `sink` is the object that consumed it.
+
+    `timings` records how many seconds answering the request spent in each
+    phase: "parse", "resolve" (finding the file), "read" (building the
+    body), "handle" (everything from parsing to having a response, which
+    includes resolve and read) and "send".
+    """
+
+    def __init__(self, method, target, version, headers, body=b""):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.sink = None
+        self.timings = {}
+        self.path, _, self.query = target.partition("?")
+
+    def header(self, name, default=None):
+        """Returns the value of the `name` header, which is not case sensitive"""
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def keep_alive(self):
+        """
+        Returns `True` if the client asked for the connection to stay open.
+
+        HTTP/1.1 connections are persistent unless the client sends
+        `Connection: close`, whereas HTTP/1.0 clients must opt in with
+        `Connection: keep-alive`.
+        """
+        connection = self.header("Connection", "").lower()
+        if self.version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+
+def parse_head(head):
+    """Parses the request line and headers in `head` into an `HTTPRequest`"""
+    # Header bytes outside ASCII are opaque data, which latin-1 keeps intact
+    lines = head.decode("latin-1").split(NEWLINE)
+    request_words = lines[0].split()
+    if len(request_words) != 3 or not request_words[2].startswith("HTTP/"):
+        raise RequestError("400 BAD REQUEST")
+    method, target, version = request_words
+
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep or not name or name != name.strip():
+            raise RequestError("400 BAD REQUEST")
+        name = name.lower()
+        value = value.strip()
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return HTTPRequest(method, target, version, headers)
+
+
+class RequestParser:
+    """
+    Parses requests incrementally from the bytes read off a connection.
+
+    `feed` takes whatever arrived and returns the requests it completed,
+    keeping any partial request for the next call. The head is read up
+    to the blank line that ends it, then exactly `Content-Length` body
+    bytes, or a chunked body is decoded as it arrives. Heads bigger than
+    `max_header_size` and bodies bigger than `max_body_size` are refused
+    with a `RequestError`.
+
+    `body_sink` may return a sink for a request once its head is parsed.
+    The body is then passed to the sink's `feed` piece by piece as it
+    arrives rather than buffered, and its `close` is called at the end of
+    the body. Streamed bodies may be up to `max_stream_size` bytes.
+
+    `send_continue` is set while the client is waiting for a
+    "100 Continue" (it sent `Expect: 100-continue`) before sending the
+    body of a request whose head we accepted.
+    """
+
+    # A chunk size line is a few hex digits plus optional extensions
+    MAX_CHUNK_LINE = 1024
+
+    def __init__(self, max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE,
+                 body_sink=None, max_stream_size=MAX_STREAM_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.body_sink = body_sink
+        self.max_stream_size = max_stream_size
+        self.buffer = bytearray()
+        self.request = None
+        self.send_continue = False
+        self.parse_seconds = 0.0
+
+    @property
+    def reading(self):
+        """
+        Returns what the parser is waiting for: the start of a "request",
+        the rest of its "head", or its "body".
+        """
+        if self.request is not None:
+            return "body"
+        return "head" if self.buffer else "request"
+
+    def feed(self, data):
+        self.buffer += data
+        requests = []
+        while True:
+            started = time.perf_counter()
+            request = self.parse_one()
+            # A request may arrive over many reads, so its time adds up
+            self.parse_seconds += time.perf_counter() - started
+            if request is None:
+                return requests
+            request.timings["parse"] = self.parse_seconds
+            self.parse_seconds = 0.0
+            requests.append(request)
+
+    def parse_one(self):
+        if self.request is None and not self.parse_request_head():
+            return None
+        if self.chunked:
+            done = self.parse_chunks()
+        else:
+            done = self.parse_fixed_body()
+        if not done:
+            return None
+
+        request, self.request = self.request, None
+        self.send_continue = False
+        if request.sink is not None:
+            request.sink.close()
+        else:
+            request.body = bytes(self.body)
+        return request
+
+    def take_body(self, count):
+        """Moves `count` bytes from the buffer to the body or its sink"""
+        if self.request.sink is not None:
+            self.request.sink.feed(bytes(self.buffer[:count]))
+            self.body_size += count
+        else:
+            self.body += self.buffer[:count]
+        del self.buffer[:count]
+
+    def parse_request_head(self):
+        header_end = self.buffer.find(HEADER_TERMINATOR)
+        if header_end == -1 and len(self.buffer) > self.max_header_size:
+            raise RequestError("431 REQUEST HEADER FIELDS TOO LARGE")
+        if header_end == -1:
+            return False
+        if header_end > self.max_header_size:
+            raise RequestError("431 REQUEST HEADER FIELDS TOO LARGE")
+
+        self.request = parse_head(bytes(self.buffer[:header_end]))
+        del self.buffer[:header_end + len(HEADER_TERMINATOR)]
+        self.body = bytearray()
+        self.body_size = 0
+        if self.body_sink is not None:
+            self.request.sink = self.body_sink(self.request)
+        max_size = self.max_body_size if self.request.sink is None else self.max_stream_size
+
+        transfer_encoding = self.request.header("Transfer-Encoding")
+        if transfer_encoding is not None:
+            if transfer_encoding.lower() != "chunked":
+                raise RequestError("501 NOT IMPLEMENTED")
+            self.chunked = True
+            self.chunk_remaining = 0
+            self.chunk_crlf = False
+            self.in_trailers = False
+            self.send_continue = self.expects_continue()
+            return True
+
+        self.chunked = False
+        try:
+            self.remaining = int(self.request.header("Content-Length", "0"))
+        except ValueError:
+            raise RequestError("400 BAD REQUEST")
+        if self.remaining < 0:
+            raise RequestError("400 BAD REQUEST")
+        if self.remaining > max_size:
+            raise RequestError("413 CONTENT TOO LARGE")
+        self.send_continue = self.remaining > 0 and self.expects_continue()
+        return True
+
+    def expects_continue(self):
+        return (self.request.version == "HTTP/1.1"
+                and self.request.header("Expect", "").lower() == "100-continue")
+
+    def parse_fixed_body(self):
+        take = min(self.remaining, len(self.buffer))
+        if take:
+            self.take_body(take)
+            self.remaining -= take
+        return self.remaining == 0
+
+    def parse_chunks(self):
+        while True:
+            if self.chunk_remaining:
+                take = min(self.chunk_remaining, len(self.buffer))
+                self.take_body(take)
+                self.chunk_remaining -= take
+                if self.chunk_remaining:
+                    return False
+                self.chunk_crlf = True
+
+            if self.chunk_crlf:
+                if len(self.buffer) < 2:
+                    return False
+                if self.buffer[:2] != b"\r\n":
+                    raise RequestError("400 BAD REQUEST")
+                del self.buffer[:2]
+                self.chunk_crlf = False
+
+            line_end = self.buffer.find(b"\r\n")
+            if line_end == -1:
+                if len(self.buffer) > self.MAX_CHUNK_LINE:
+                    raise RequestError("400 BAD REQUEST")
+                return False
+            line = bytes(self.buffer[:line_end])
+            del self.buffer[:line_end + 2]
+
+            if self.in_trailers:
+                # Trailer fields are ignored; a blank line ends the body
+                if not line:
+                    return True
+                continue
+
+            try:
+                size = int(line.split(b";", 1)[0], 16)
+            except ValueError:
+                raise RequestError("400 BAD REQUEST")
+            if size < 0:
+                raise RequestError("400 BAD REQUEST")
+            if size == 0:
+                self.in_trailers = True
+            elif self.request.sink is not None:
+                if self.body_size + size > self.max_stream_size:
+                    raise RequestError("413 CONTENT TOO LARGE")
+            elif len(self.body) + size > self.max_body_size:
+                raise RequestError("413 CONTENT TOO LARGE")
+            self.chunk_remaining = size
+
+
+# Sent as-is to connections we have no capacity to serve, to clients with too
+# many connections open, and to clients too slow to send their request
+SERVICE_UNAVAILABLE = response_header("503 SERVICE UNAVAILABLE",
+                                      {"Retry-After": RETRY_AFTER, "Content-Length": 0})
+TOO_MANY_CONNECTIONS = response_header("429 TOO MANY REQUESTS",
+                                       {"Retry-After": RETRY_AFTER, "Content-Length": 0})
+REQUEST_TIMEOUT = response_header("408 REQUEST TIMEOUT", {"Content-Length": 0})
+
+# Tells a client that sent `Expect: 100-continue` to go ahead with the body
+CONTINUE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+
+class Connection:
+    """A client connection, with what it has sent so far and how far it got"""
+
+    def __init__(self, sock, address, parser):
+        self.sock = sock
+        self.address = address
+        self.parser = parser
+        self.served = 0
+        # Whether it was just found to have data to read
+        self.ready = False
+        # Whether it counts as idle (see `AdmissionControl.rest`)
+        self.resting = False
+        # While parked: when it is closed if it stays idle, and which time
+        # it was parked (see `IdleConnections`)
+        self.deadline = None
+        self.parked = False
+        self.parking = 0
+
+
+class IdleConnections:
+    """
+    Watches the connections waiting for their next request, so that idle
+    keep-alive clients don't each hold a worker. One thread waits on all of
+    them with a selector, and hands a connection to `resume` as soon as it
+    has data to read, or to `expire` once it has stayed idle past its
+    `deadline`.
+
+    Once `stopping` is set, connections that were already served are
+    expired at once, and new ones get `grace` seconds to send their first
+    request.
+    """
+
+    def __init__(self, resume, expire, stopping, grace=DRAIN_POLL_INTERVAL):
+        self.resume = resume
+        self.expire = expire
+        self.stopping = stopping
+        self.grace = grace
+        self.selector = selectors.DefaultSelector()
+        # Only the watching thread touches the selector; other threads hand
+        # it connections through `incoming` and wake it up with a byte.
+        self.incoming = deque()
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.wake_write.setblocking(False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+        # `(deadline, parking, connection)`, where entries for connections
+        # that were resumed or parked again since are skipped
+        self.deadlines = []
+        self.parkings = 0
+        self.count = 0
+        self.saw_stop = False
+        self.closed = False
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def park(self, conn):
+        """Watches `conn` until it has data to read or reaches its `deadline`"""
+        self.incoming.append(conn)
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wake_write.send(b"\0")
+        except BlockingIOError:
+            pass  # it has plenty of wake-ups waiting already
+
+    def run(self):
+        while not self.closed:
+            now = time.monotonic()
+            while self.incoming:
+                self.add(self.incoming.popleft(), now)
+            if self.stopping.is_set() and not self.saw_stop:
+                self.saw_stop = True
+                for key in list(self.selector.get_map().values()):
+                    if key.data is not None:
+                        self.limit(key.data, now)
+
+            timeout = DRAIN_POLL_INTERVAL
+            if self.deadlines:
+                timeout = max(0.0, min(timeout, self.deadlines[0][0] - now))
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self.wake_read.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                conn = self.remove(key.data)
+                conn.ready = True
+                self.resume(conn)
+
+            now = time.monotonic()
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, parking, conn = heapq.heappop(self.deadlines)
+                if conn.parked and conn.parking == parking:
+                    self.expire(self.remove(conn))
+
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                self.expire(self.remove(key.data))
+        while self.incoming:
+            self.expire(self.incoming.popleft())
+
+    def add(self, conn, now):
+        self.parkings += 1
+        conn.parked = True
+        conn.parking = self.parkings
+        self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+        self.count += 1
+        if self.stopping.is_set():
+            self.limit(conn, now)
+        else:
+            heapq.heappush(self.deadlines, (conn.deadline, conn.parking, conn))
+
+    def limit(self, conn, now):
+        # What's left of an idle connection's time once we're stopping
+        if conn.served:
+            self.expire(self.remove(conn))
+            return
+        conn.deadline = min(conn.deadline, now + self.grace)
+        heapq.heappush(self.deadlines, (conn.deadline, conn.parking, conn))
+
+    def remove(self, conn):
+        self.selector.unregister(conn.sock)
+        conn.parked = False
+        self.count -= 1
+        return conn
+
+    def close(self):
+        """Stops watching, expiring the connections still parked"""
+        self.closed = True
+        self.wake()
+        self.thread.join()
+        self.selector.close()
+        self.wake_read.close()
+        self.wake_write.close()
+
+
+class WorkerPool:
+    """
+    A fixed set of worker threads pulling jobs off a bounded queue.
+
+    Unlike starting a `Thread` per job, the number of threads never grows
+    past `workers`, and `submit` returns `False` instead of blocking when
+    `queue_size` jobs are already waiting.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.jobs = Queue(maxsize=queue_size)
+        self.lock = Lock()
+        self.busy = 0
+        self.rejected = 0
+        self.threads = [Thread(target=self.run, daemon=True) for _ in range(workers)]
+        for th in self.threads:
+            th.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            target, args = job
+            with self.lock:
+                self.busy += 1
+            try:
+                target(*args)
+            except Exception:
+                # A failed job mustn't take its worker with it
+                traceback.print_exc()
+            finally:
+                with self.lock:
+                    self.busy -= 1
+
+    def submit(self, target, *args):
+        """Queues `target(*args)`, returning `False` if the queue is full"""
+        try:
+            self.jobs.put_nowait((target, args))
+            return True
+        except Full:
+            with self.lock:
+                self.rejected += 1
+            return False
+
+    def queue_depth(self):
+        """Returns the number of jobs waiting for a free worker"""
+        return self.jobs.qsize()
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.jobs.put(None)
+        for th in self.threads:
+            th.join()
+
+
+class ThreadPerJob:
+    """
+    The original executor: every job gets its own `Thread`. Kept so the
+    pool can be compared against it, it never queues or rejects.
+    """
+
+    rejected = 0
+
+    def submit(self, target, *args):
+        Thread(target=target, args=args).start()
+        return True
+
+    def queue_depth(self):
+        return 0
+
+    def shutdown(self):
+        pass
+
+
+def make_executor(name, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+    """Returns the executor backend called `name` ("pool" or "thread")"""
+    if name == "pool":
+        return WorkerPool(workers, queue_size)
+    if name == "thread":
+        return ThreadPerJob()
+    raise ValueError(f"Unknown executor: {name}")
+
+
+class AdmissionControl:
+    """
+    Counts the connections being served, in total and per client address,
+    so new ones can be turned away cheaply once there are `max_in_flight`
+    (or `max_per_ip` from the same address). Shedding the excess keeps
+    latency bounded for the connections already admitted instead of
+    slowing everyone down.
+
+    A keep-alive connection waiting for its next request `rest`s: it stops
+    counting as in flight, so idle clients can't crowd out busy ones, and
+    counts as `idle` instead, of which there may be `max_idle`. Any limit
+    may be `None` for no limit.
+    """
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_per_ip=MAX_CONNECTIONS_PER_IP,
+                 max_idle=MAX_IDLE_CONNECTIONS):
+        self.max_in_flight = max_in_flight
+        self.max_per_ip = max_per_ip
+        self.max_idle = max_idle
+        self.lock = Lock()
+        self.in_flight = 0
+        self.idle = 0
+        self.per_ip = {}
+        self.rejected = 0
+
+    def admit(self, ip):
+        """
+        Counts a new connection from `ip`. Returns `None` if it may be
+        served, otherwise the response to turn it away with.
+        """
+        with self.lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return SERVICE_UNAVAILABLE
+            count = self.per_ip.get(ip, 0)
+            if self.max_per_ip is not None and count >= self.max_per_ip:
+                self.rejected += 1
+                return TOO_MANY_CONNECTIONS
+            self.in_flight += 1
+            self.per_ip[ip] = count + 1
+            return None
+
+    def rest(self):
+        """
+        Counts an admitted connection as idle rather than in flight.
+        Returns `False`, leaving it in flight, if it should be closed
+        because there are `max_idle` idle connections already.
+        """
+        with self.lock:
+            if self.max_idle is not None and self.idle >= self.max_idle:
+                return False
+            self.in_flight -= 1
+            self.idle += 1
+            return True
+
+    def resume(self):
+        """Counts a connection that `rest`ed as in flight again"""
+        with self.lock:
+            self.idle -= 1
+            self.in_flight += 1
+
+    def release(self, ip, idle=False):
+        """Stops counting a connection from `ip` that was admitted"""
+        with self.lock:
+            if idle:
+                self.idle -= 1
+            else:
+                self.in_flight -= 1
+            count = self.per_ip.pop(ip) - 1
+            if count:
+                self.per_ip[ip] = count
+
+
+class HTTPResponse:
+    """
+    A response made of an encoded `head` and a list of body `parts` that
+    are written out one after another, never joined into one buffer.
+
+    A part is either `bytes`/`memoryview`, or an `(offset, count)` range of
+    `file_name`, which is sent straight from the kernel with `sendfile`.
+
+    A `stream` is an iterable sent after the parts as it is produced, each
+    item bytes or a list of buffers written together (see `encode_chunks`),
+    counting what was sent in `streamed`. A response with
+    `close` set is the last one on its connection.
+    """
+
+    def __init__(self, head, parts=(), file_name=None, stream=None, close=False):
+        self.head = head
+        self.parts = list(parts)
+        self.file_name = file_name
+        self.stream = stream
+        self.streamed = 0
+        self.close = close
+
+    @property
+    def status(self):
+        """The three digit status code, e.g. "200" """
+        return self.head[9:12].decode("ascii")
+
+    @property
+    def size(self):
+        """The number of bytes in the whole response"""
+        return len(self.head) + self.streamed + sum(
+            part[1] if isinstance(part, tuple) else len(part) for part in self.parts)
+
+
+# The most buffers a single `sendmsg` call may be given (IOV_MAX on Linux)
+MAX_SEND_BUFFERS = 1024
+
+
+def send_buffers(client_sock, buffers):
+    """
+    Writes all of `buffers` with as few `sendmsg` calls as possible,
+    resuming from wherever the kernel stopped after a partial write.
+    """
+    if not hasattr(client_sock, "sendmsg"):
+        for buffer in buffers:
+            client_sock.sendall(buffer)
+        return
+
+    buffers = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while buffers:
+        sent = client_sock.sendmsg(buffers[:MAX_SEND_BUFFERS])
+        # Drop what was fully sent and trim the buffer we stopped inside
+        while sent:
+            if sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            else:
+                buffers[0] = buffers[0][sent:]
+                sent = 0
+
+
+def send_response(client_sock, response):
+    """Writes all of an `HTTPResponse` to `client_sock`"""
+    buffers = [response.head]
+    f = None
+    try:
+        for part in response.parts:
+            if not isinstance(part, tuple):
+                buffers.append(part)
+                continue
+            send_buffers(client_sock, buffers)
+            buffers = []
+            if f is None:
+                f = open(response.file_name, "rb")
+            offset, count = part
+            if client_sock.sendfile(f, offset, count) < count:
+                # The file shrank under us, so the Content-Length we sent is
+                # wrong and the connection can't be reused.
+                raise ConnectionError(f"{response.file_name} changed while sending")
+        send_buffers(client_sock, buffers)
+        if response.stream is not None:
+            for chunk in response.stream:
+                buffers = chunk if isinstance(chunk, list) else [chunk]
+                send_buffers(client_sock, buffers)
+                response.streamed += sum(map(len, buffers))
+    finally:
+        if f is not None:
+            f.close()
+        close_stream(response.stream)
+
+
+def close_stream(stream):
+    """Lets a streamed body release what it holds, sent in full or not"""
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
+
+
+def encode_chunks(chunks):
+    """
+    Frames each of `chunks` for `Transfer-Encoding: chunked`, then ends the
+    body. The framing is yielded as buffers of its own around each chunk, so
+    the chunk is written out without being copied.
+    """
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield [b"%x\r\n" % len(chunk), chunk, b"\r\n"]
+        yield [b"0\r\n\r\n"]
+    finally:
+        close_stream(chunks)
+
+
+class PathInfo:
+    """
+    What we know about a file on disk from a single `os.stat`: its `stat`
+    result, whether others may read it, and how it should be sent. Bundles
+    from the asset pipeline never change, so browsers may cache them for good.
+    """
+
+    def __init__(self, path, file_stat):
+        self.path = path
+        self.stat = file_stat
+        self.readable = file_stat.st_mode & stat.S_IROTH > 0
+        self.extension = os.path.splitext(path)[1][1:]
+        try:
+            self.mime_type = get_file_mime_type(self.extension)
+        except KeyError:
+            self.mime_type = "text/plain"
+        self.binary = should_return_binary(self.extension)
+        if is_hashed_asset(path):
+            self.cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            self.cache_control = get_cache_control(self.extension)
+
+
+class PathIndex:
+    """
+    Resolves requested files to regular files under the document `root`.
+
+    Every path is normalized and refused if it would leave `root`, then
+    looked up with one `os.stat`. Results, including files that don't
+    exist, are cached for `ttl` seconds. HTML pages are served from
+    `page_dir`.
+    """
+
+    def __init__(self, root=".", ttl=PATH_CACHE_TTL, max_entries=PATH_CACHE_ENTRIES,
+                 page_dir=PAGE_DIR):
+        self.root = os.path.abspath(root)
+        self.page_dir = page_dir
+        # Patterns of the paths the server writes its own data to (see `hide`)
+        self.hidden = []
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.stat_seconds = 0.0
+
+    def resolve(self, requested_file):
+        """
+        Returns the `PathInfo` for a requested file, or `None` if there is
+        no such file. HTML pages live in `page_dir`; any other file is
+        looked for relative to the root, then relative to "static", which
+        is where the pages' "/css", "/js" and "/img" links point.
+        """
+        if requested_file.endswith('.html'):
+            filename = os.path.basename(requested_file)
+            return self.lookup(os.path.join(self.page_dir, filename))
+        info = self.lookup(requested_file)
+        if info is None:
+            info = self.lookup(os.path.join('static', requested_file))
+        return info
+
+    def hide(self, path):
+        """
+        Refuses to serve `path`, so a log file is hidden along with its
+        rotated copies ("access.log.1") and per-process variants
+        ("access.1234.log", whichever of them `path` is), and a directory
+        along with everything in it. Other files named like it are served.
+        """
+        root, extension = os.path.splitext(os.path.abspath(path))
+        root = re.sub(r"\.\d+$", "", root)
+        self.hidden.append(re.compile(re.escape(root) + r"(\.\d+)?" + re.escape(extension)
+                                      + r"(\.\d+)*(" + re.escape(os.sep) + "|$)"))
+
+    def lookup(self, relative_path):
+        """Returns the `PathInfo` for `relative_path` under the root, or `None`"""
+        path = os.path.normpath(os.path.join(self.root, relative_path.lstrip("/")))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None
+        if any(pattern.match(path) for pattern in self.hidden):
+            return None
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] > now:
+                if entry[1] is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        started = time.perf_counter()
+        try:
+            file_stat = os.stat(path)
+            info = PathInfo(path, file_stat) if stat.S_ISREG(file_stat.st_mode) else None
+        except (OSError, ValueError):
+            # Missing, unreadable, too long a name or an embedded NUL: all
+            # answered as not found
+            info = None
+        elapsed = time.perf_counter() - started
+
+        with self.lock:
+            self.stat_seconds += elapsed
+            self.entries[path] = (now + self.ttl, info)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return info
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits,
+                    "negative_hits": self.negative_hits, "misses": self.misses,
+                    "stat_seconds": self.stat_seconds}
+
+
+class ResponseCache:
+    """
+    A least recently used cache of built responses, limited to `max_bytes`
+    of header and body bytes in total.
+
+    Each entry remembers the modification time and size of the file it was
+    built from, and is thrown away as soon as either of them changes.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, file_stat):
+        """
+        Returns the `(head, body)` cached under `key`, or `None` if there is
+        no entry or it was built from a different version of the file.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            mtime, size, head, body = entry
+            if mtime != file_stat.st_mtime_ns or size != file_stat.st_size:
+                self.discard(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return head, body
+
+    def put(self, key, file_stat, head, body):
+        entry_size = len(head) + len(body)
+        if entry_size > self.max_bytes:
+            return
+        with self.lock:
+            self.discard(key)
+            self.entries[key] = (file_stat.st_mtime_ns, file_stat.st_size, head, body)
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self.discard(oldest)
+                self.evictions += 1
+
+    def discard(self, key):
+        # Callers must hold `self.lock`
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2]) + len(entry[3])
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}
+
+
+def parse_form(body):
+    """
+    Returns the fields of an "x-www-form-urlencoded" `body` as a dictionary.
+    Pairs without a "=" are ignored.
+    """
+    parsed_data = {}
+    for pair in body.decode("utf-8", errors="replace").split("&"):
+        if "=" in pair:
+            key, value = pair.split("=", 1)
+            parsed_data[unquote(key)] = unquote(value.replace("+", " "))
+    return parsed_data
+
+
+def prefers_json(request):
+    """
+    Returns `True` if the client asked for JSON rather than a page, e.g. a
+    script posting an event, as opposed to a browser submitting the form.
+    """
+    accept = request.header("Accept", "").lower()
+    return "application/json" in accept and "text/html" not in accept
+
+
 def submission_to_table(data):
-    return f'''
-    <!DOCTYPE html>
-    <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Event Submission</title>
-            <link rel="stylesheet" href="/styles.css">
-        </head>
-        <body>
-            <nav class="navbar">
-                <a href="/" class="logo"><img src="/img/favicon.ico" alt="CSCI4131 icon"></a>
-                <div class="nav-links">
-                    <a href="/aboutme">About Me</a>
-                    <a href="/myschedule">My Schedule</a>
-                    <a href="/myform">Form Input</a>
-                </div>
-            </nav>
-            <h1>My New Event</h1>
-            <div class="main schedule-main" style="display: block; position: relative;">
-                <div class="main-left" style="width: 100%;">
-                    <table>
-                        <thead>
-                            <tr>
-                                <th>Event</th>
-                                <th>Day</th>
-                                <th>Start</th>
-                                <th>End</th>
-                                <th>Phone</th>
-                                <th>Location</th>
-                                <th>URL</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            <tr>
-                                <td>{data["event"]}</td>
-                                <td>{data["day"]}</td>
-                                <td>{data["start"]}</td>
-                                <td>{data["end"]}</td>
-                                <td>{data["phone"]}</td>
-                                <td>{data["location"]}</td>
-                                <td><a href="{data['url']}">More Info</a></td>
-                            </tr>
-                        </tbody>
-                    </table>
-                </div>
-            </div>
-            <footer>
-                <div class="footer-container">
-                    <div class="footer-left">
-                        <div class="footer-links">
-                            <a href="https://www.linkedin.com/in/gustavo-sakamoto-de-toledo-3120a0240/">LinkedIn</a>
-                            <a href="mailto:gustavosakamotox@gmail.com">Email</a>
-                            <a href="https://www.instagram.com/gustavo.sakamoto.toledo/">Instagram</a>
-                        </div>
-                    </div>
-                </div>
-                <p>&copy; Copyright 2025 by Gustavo Sakamoto de Toledo</p>
-            </footer>
-        </body>
-    </html>
-    '''
-
-
-def redirect_handler(query_string):
+    """
+    Returns the event page showing the submitted event `data` as a table
+    row, as a list of encoded segments (see `templates.render_event_page`).
+    """
+    return render_event_page([data], heading="My New Event")
+
+
+def redirect_handler(query_string, keep_alive=False):
     params = query_string.split('&')
     search_query = ""
 
@@ -229,10 +1368,55 @@ def redirect_handler(query_string):
                 search_query = unquote(value.replace('+', ' '))
                 break
     location = f'https://www.youtube.com/results?search_query={search_query}'
-    response = (f'HTTP/1.1 307 TEMPORARY REDIRECT{NEWLINE}'
-                f'Location: {location}{NEWLINE}'
-                f'Connection: closed{NEWLINE}{NEWLINE}')
-    return response.encode('utf-8')
+    return HTTPResponse(response_header("307 TEMPORARY REDIRECT",
+                                        {"Location": location, "Content-Length": 0},
+                                        keep_alive))
+
+
+def inherited_socket():
+    """
+    Returns the listening socket handed over by the server process we are
+    replacing (see `HTTPServer.restart`), or `None`.
+    """
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    return socket.socket(fileno=int(fd)) if fd is not None else None
+
+
+def notify_ready():
+    """Tells the server process we are replacing that we are accepting connections"""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if fd is not None:
+        try:
+            os.write(int(fd), READY)
+        finally:
+            os.close(int(fd))
+
+
+def notify_locked():
+    """
+    Asks the server process we are replacing for the event log. Raises
+    `StoreLocked` if we aren't replacing one, since then someone else is
+    writing to it.
+    """
+    fd = os.environ.get(READY_FD_ENV)
+    if fd is None:
+        raise StoreLocked("the event log is in use by another process")
+    os.write(int(fd), LOCKED)
+
+
+def listening_socket(host, port, reuse_port=False):
+    """
+    Returns a socket bound to `host`:`port` and listening for connections.
+    With `reuse_port`, several processes may bind the same port and the
+    kernel spreads incoming connections between them.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
 
 
 class HTTPServer:
@@ -240,84 +1424,463 @@ class HTTPServer:
     Our actual HTTP server which will service GET and POST requests.
     """
 
-    def __init__(self, host="localhost", port=4131, directory="."):
+    def __init__(self, host="localhost", port=4131, directory=".",
+                 keep_alive_timeout=KEEP_ALIVE_TIMEOUT,
+                 max_keep_alive_requests=MAX_KEEP_ALIVE_REQUESTS,
+                 header_timeout=HEADER_TIMEOUT, body_timeout=BODY_TIMEOUT,
+                 write_timeout=WRITE_TIMEOUT, max_in_flight=MAX_IN_FLIGHT,
+                 max_per_ip=MAX_CONNECTIONS_PER_IP, max_idle=MAX_IDLE_CONNECTIONS,
+                 executor="pool", workers=DEFAULT_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, sock=None, reuse_port=False,
+                 cache_bytes=DEFAULT_CACHE_BYTES,
+                 sendfile_threshold=SENDFILE_THRESHOLD,
+                 max_header_size=MAX_HEADER_SIZE, max_body_size=MAX_BODY_SIZE,
+                 event_log=EVENT_LOG_PATH, stock_upstream=None,
+                 access_log=ACCESS_LOG_PATH, profiler=None, admin=False,
+                 drain_timeout=DRAIN_TIMEOUT, stop_signals=(), restart_signal=None,
+                 app=None, page_dir=PAGE_DIR):
         print(f"Server started. Listening at http://{host}:{port}/")
         self.host = host
         self.port = port
         self.working_dir = directory
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.header_timeout = header_timeout
+        self.body_timeout = body_timeout
+        self.write_timeout = write_timeout
+        self.admission = AdmissionControl(max_in_flight, max_per_ip, max_idle)
+        self.executor = self.create_executor(executor, workers, queue_size)
+        self.cache = ResponseCache(cache_bytes)
+        self.paths = PathIndex(directory, page_dir=page_dir)
+        self.sendfile_threshold = sendfile_threshold
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.sock = sock
+        self.reuse_port = reuse_port
+        # Without an event log, events are shown back but not stored
+        self.events = None
+        if event_log is not None:
+            self.events = EventStore(event_log, on_locked=notify_locked)
+        self.quotes = QuoteCache(make_upstream(stock_upstream))
+        self.access_log = AccessLog(access_log) if access_log is not None else None
+        self.metrics = Metrics()
+        self.register_metrics()
+        self.profiler = profiler if profiler is not None else RequestProfiler()
+        # Our own data files may be in the document root, but aren't for sharing
+        for data_path in (event_log, access_log, self.profiler.directory):
+            if data_path is not None:
+                self.paths.hide(data_path)
+        self.admin = admin
+        # An application answering every request in place of our own routes
+        # (see `apps`), apart from "/metrics"
+        self.app = app
+        self.drain_timeout = drain_timeout
+        self.drain_deadline = None
+        self.stopping = Event()
+        # Where the threaded engine keeps connections between requests
+        self.idle = None
+        # Signal handlers can only be set from the main thread
+        for signum in stop_signals:
+            signal.signal(signum, self.stop)
+        if restart_signal is not None:
+            signal.signal(restart_signal,
+                          lambda signum, frame: Thread(target=self.restart).start())
 
         self.setup_socket()
+        notify_ready()
         self.accept()
 
         self.teardown_socket()
+        self.drain()
+        self.close()
+
+    def stop(self, signum=None, frame=None):
+        """
+        Stops accepting connections and lets those in flight finish, for up
+        to `drain_timeout` seconds. Responses sent meanwhile close their
+        connection. Being told to stop a second time exits at once.
+        """
+        if self.stopping.is_set():
+            if signum is not None:
+                raise SystemExit(1)
+            return
+        self.drain_deadline = time.monotonic() + self.drain_timeout
+        self.stopping.set()
+        if self.idle is not None:
+            # Close the idle connections now rather than at its next poll
+            self.idle.wake()
+
+    def drain(self):
+        """Waits for the connections in flight to finish, until the drain deadline"""
+        while ((self.admission.in_flight or self.admission.idle)
+               and time.monotonic() < self.drain_deadline):
+            time.sleep(0.05)
+
+    def close(self):
+        if self.idle is not None:
+            self.idle.close()
+        if self.events is not None:
+            self.events.close()
+        if self.access_log is not None:
+            self.access_log.close()
+
+    def restart(self):
+        """
+        Replaces this process with a fresh copy of the server without
+        refusing any connections. The new process inherits the listening
+        socket, so connections keep queuing on it throughout, and this one
+        only stops accepting once the new one says it's ready. Then it
+        drains and exits as if told to stop.
+
+        The event log is handed over when the new process asks for it, so
+        only one process ever writes it and the new one indexes all of it.
+        Events posted here in between are refused with a 503.
+        """
+        ready_read, ready_write = os.pipe()
+        fd = self.sock.fileno()
+        env = dict(os.environ, **{LISTEN_FD_ENV: str(fd), READY_FD_ENV: str(ready_write)})
+        try:
+            child = subprocess.Popen([sys.executable] + sys.argv, env=env,
+                                     pass_fds=(fd, ready_write))
+        except OSError as error:
+            print(f"Restart failed: {error}")
+            return
+        finally:
+            os.close(ready_write)
+        deadline = time.monotonic() + RESTART_TIMEOUT
+        message = None
+        try:
+            while message != READY:
+                readable, _, _ = select.select([ready_read], [], [],
+                                               max(0.0, deadline - time.monotonic()))
+                message = os.read(ready_read, 1) if readable else b""
+                if not message:
+                    break
+                if message == LOCKED and self.events is not None:
+                    self.events.hand_over()
+        finally:
+            os.close(ready_read)
+        if message != READY:
+            print("Restart failed: the new server didn't start; still serving")
+            child.kill()
+            child.wait()
+            if self.events is not None:
+                self.events.take_back()
+            return
+        print(f"Handed over to process {child.pid}; draining")
+        self.stop()
+
+    def create_executor(self, executor, workers, queue_size):
+        return make_executor(executor, workers, queue_size)
+
+    def register_metrics(self):
+        """Adds the server's gauges and cache counters to `self.metrics`"""
+        register = self.metrics.register
+        register("http_connections_active", "gauge",
+                 "Connections being served or waiting for a worker.",
+                 lambda: self.admission.in_flight)
+        register("http_connections_rejected_total", "counter",
+                 "Connections turned away for lack of capacity.",
+                 lambda: self.admission.rejected + getattr(self.executor, "rejected", 0))
+        register("http_connections_idle", "gauge",
+                 "Keep-alive connections waiting for their next request.",
+                 lambda: self.admission.idle)
+        register("worker_threads", "gauge", "Threads available to serve requests.",
+                 lambda: self.worker_usage()[1])
+        register("worker_threads_busy", "gauge", "Threads currently serving requests.",
+                 lambda: self.worker_usage()[0])
+        register("worker_utilization", "gauge", "Fraction of the threads that are busy.",
+                 self.worker_utilization)
+        register("worker_queue_depth", "gauge", "Jobs waiting for a free thread.",
+                 lambda: self.worker_usage()[2])
+        register("cache_hits_total", "counter", "Lookups answered from a cache.",
+                 lambda: [({"cache": name}, hits) for name, hits, _ in self.cache_lookups()])
+        register("cache_misses_total", "counter", "Lookups a cache couldn't answer.",
+                 lambda: [({"cache": name}, misses) for name, _, misses in self.cache_lookups()])
+        register("cache_hit_ratio", "gauge", "Fraction of lookups answered from a cache.",
+                 lambda: [({"cache": name}, hit_ratio(hits, misses))
+                          for name, hits, misses in self.cache_lookups()])
+        register("cache_evictions_total", "counter",
+                 "Entries dropped from a cache to stay within its size.",
+                 lambda: [({"cache": "response"}, self.cache.stats()["evictions"])])
+        register("path_negative_hits_total", "counter",
+                 "Lookups of missing files answered from the path index.",
+                 lambda: self.paths.stats()["negative_hits"])
+        register("path_stat_seconds_total", "counter",
+                 "Seconds spent in stat() resolving requested files.",
+                 lambda: self.paths.stats()["stat_seconds"])
+        if self.events is not None:
+            register("events_stored", "gauge", "Events in the event log.",
+                     lambda: len(self.events))
+        if self.access_log is not None:
+            register("access_log_records_written_total", "counter",
+                     "Requests written to the access log.",
+                     lambda: self.access_log.written)
+            register("access_log_records_dropped_total", "counter",
+                     "Requests left out of the access log because its buffer was full.",
+                     lambda: self.access_log.dropped)
+
+    def worker_usage(self):
+        """Returns how many worker threads are `(busy, available, queued)`"""
+        threads = getattr(self.executor, "threads", None)
+        if threads is None:
+            # A thread per connection being served; parked ones have none
+            busy = self.admission.in_flight + self.admission.idle
+            busy -= self.idle.count if self.idle is not None else 0
+            return busy, busy, 0
+        return self.executor.busy, len(threads), self.executor.queue_depth()
+
+    def worker_utilization(self):
+        busy, available, _ = self.worker_usage()
+        return busy / available if available else 0.0
+
+    def cache_lookups(self):
+        """Returns `(name, hits, misses)` for each of the server's caches"""
+        paths = self.paths.stats()
+        quotes = self.quotes.stats()
+        return [("response", self.cache.hits, self.cache.misses),
+                ("path", paths["hits"] + paths["negative_hits"], paths["misses"]),
+                ("quote", quotes["hits"] + quotes["stale_hits"], quotes["misses"])]
+
+    def record(self, request, response, start, client):
+        """
+        Counts a `request` from `client` answered with `response`, which
+        began at `start`, and adds it to the access log.
+        """
+        seconds = time.perf_counter() - start
+        status = response.status
+        size = response.size
+        path = unquote(request.path)[1:]
+        if self.app is not None and path != "metrics":
+            route = "app"
+        else:
+            route = path if path in METRIC_ROUTES else "static"
+        method = request.method if request.method in METRIC_METHODS else "other"
+        self.metrics.observe(route, method, status, seconds, size)
+        if self.access_log is not None:
+            self.access_log.log(client, request.method, request.target, status, size, seconds,
+                                request.timings)
 
     def setup_socket(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.bind((self.host, self.port))
-        self.sock.listen(128)
+        # A listening socket handed to us (e.g. inherited from a pre-fork
+        # supervisor) is already bound, so there is nothing to set up.
+        if self.sock is not None:
+            return
+        self.sock = listening_socket(self.host, self.port, self.reuse_port)
 
     def teardown_socket(self):
+        # Only close our descriptor: shutting the socket down would stop it
+        # listening in every process sharing it (pre-fork workers, or the
+        # server we handed it to on restart).
         if self.sock is not None:
-            self.sock.shutdown(socket.SHUT_RDWR)
             self.sock.close()
 
     def accept(self):
-        while True:
-            (client, address) = self.sock.accept()
-            th = Thread(target=self.accept_request, args=(client, address))
-            th.start()
+        self.idle = IdleConnections(self.resume, self.finish, self.stopping)
+        # Wake up now and then to notice being told to stop
+        self.sock.settimeout(DRAIN_POLL_INTERVAL)
+        while not self.stopping.is_set():
+            try:
+                (client, address) = self.sock.accept()
+            except socket.timeout:
+                continue
+            rejection = self.admission.admit(address[0])
+            if rejection is not None:
+                self.reject(client, rejection)
+                continue
+            # A worker only takes the connection once its request arrives
+            conn = Connection(client, address,
+                              RequestParser(self.max_header_size, self.max_body_size,
+                                            self.body_sink))
+            conn.deadline = time.monotonic() + self.keep_alive_timeout
+            self.idle.park(conn)
 
-    def accept_request(self, client_sock, client_addr):
-        data = client_sock.recv(4096)
-        req = data.decode("utf-8")
+    def resume(self, conn):
+        """Hands a connection that has data to read to a worker"""
+        if conn.resting:
+            conn.resting = False
+            self.admission.resume()
+        if not self.executor.submit(self.accept_request, conn):
+            self.reject(conn.sock)
+            self.finish(conn)
 
-        response = self.process_response(req)
-        client_sock.send(response)
+    def finish(self, conn):
+        """Closes a connection we are done with"""
+        try:
+            conn.sock.shutdown(1)
+        except OSError:
+            pass
+        conn.sock.close()
+        self.admission.release(conn.address[0], conn.resting)
 
-        # clean up
-        client_sock.shutdown(1)
+    def reject(self, client_sock, response=SERVICE_UNAVAILABLE):
+        """Turns away a connection we have no capacity for"""
+        try:
+            client_sock.settimeout(0)
+            client_sock.send(response)
+        except OSError:
+            pass
         client_sock.close()
 
-    def process_response(self, request):
-        formatted_data = request.strip().split(NEWLINE)
-        request_words = formatted_data[0].split()
+    def read_deadline(self, parser, phase, deadline):
+        """
+        Returns what a connection's `parser` is waiting to read (see
+        `RequestParser.reading`) and the time by which it must arrive.
+        The clock starts when the phase does rather than at each read, so a
+        client trickling in a byte at a time can't hold on to a connection.
+        """
+        reading = parser.reading
+        if reading != phase:
+            timeout = {"request": self.keep_alive_timeout,
+                       "head": self.header_timeout,
+                       "body": self.body_timeout}[reading]
+            deadline = time.monotonic() + timeout
+        return reading, deadline
 
-        if len(request_words) == 0:
-            return
+    def accept_request(self, conn):
+        """
+        Serves the requests sent over `conn` until the client asks to close,
+        goes idle for `keep_alive_timeout` seconds, or reaches
+        `max_keep_alive_requests`. Pipelined requests that are already in
+        the buffer are answered in the order they arrived. A client that
+        takes too long to send a request gets a 408 (see `read_deadline`).
+        Between requests the connection is parked (see `IdleConnections`)
+        so it doesn't hold on to the worker. Once the server is stopping,
+        idle connections are closed and the rest are closed after their
+        current response.
+        """
+        client_sock, parser = conn.sock, conn.parser
+        keep_alive = True
+        phase = deadline = None
+        try:
+            while keep_alive:
+                phase, deadline = self.read_deadline(parser, phase, deadline)
+                # A connection accepted just before stopping still gets its
+                # first request answered, if it sends one without delay
+                if phase == "request" and conn.served and self.stopping.is_set():
+                    break
+                if phase == "request" and not conn.ready:
+                    # Nothing to read yet: wait for it without a worker
+                    if conn.served:
+                        if not self.admission.rest():
+                            break
+                        conn.resting = True
+                    conn.deadline = deadline
+                    self.idle.park(conn)
+                    return
+                conn.ready = False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout
+                client_sock.settimeout(remaining)
+                try:
+                    chunk = client_sock.recv(65536)
+                except socket.timeout:
+                    if phase == "request":
+                        break
+                    raise
+                if not chunk:
+                    break
+                try:
+                    requests = parser.feed(chunk)
+                except RequestError as error:
+                    phase = None
+                    client_sock.settimeout(self.write_timeout)
+                    send_response(client_sock, self.bad_request(error.status))
+                    break
 
-        requested_file = request_words[1][1:]
-        if request_words[0] == "GET":
-            return self.get_request(requested_file, formatted_data)
-        if request_words[0] == "POST":
-            return self.post_request(requested_file, formatted_data)
-        return self.method_not_allowed()
+                if requests:
+                    # Writing isn't reading: restart the read clock afterwards
+                    phase = None
+                    client_sock.settimeout(self.write_timeout)
+                for req in requests:
+                    conn.served += 1
+                    keep_alive = (req.keep_alive and conn.served < self.max_keep_alive_requests
+                                  and not self.stopping.is_set())
+                    start = time.perf_counter()
+                    response = self.process_response(req, keep_alive)
+                    keep_alive = keep_alive and not response.close
+                    sending = time.perf_counter()
+                    send_response(client_sock, response)
+                    req.timings["send"] = time.perf_counter() - sending
+                    self.record(req, response, start, conn.address[0])
+                    if not keep_alive:
+                        break
+                # Only after answering the requests before it
+                if keep_alive and parser.send_continue:
+                    parser.send_continue = False
+                    client_sock.settimeout(self.write_timeout)
+                    client_sock.sendall(CONTINUE)
+        except socket.timeout:
+            if phase in ("head", "body"):
+                try:
+                    client_sock.settimeout(0)
+                    client_sock.send(REQUEST_TIMEOUT)
+                except OSError:
+                    pass
+        except ConnectionError:
+            pass
+        except Exception:
+            traceback.print_exc()
+            # Only answer if we weren't halfway through sending a response
+            if phase is not None:
+                try:
+                    client_sock.settimeout(0)
+                    client_sock.send(self.internal_error().head)
+                except OSError:
+                    pass
+        self.finish(conn)
 
-    def head_request(self, requested_file, data) -> bytes:
-        if requested_file.endswith('.html'):
-            filename = os.path.basename(requested_file)
-            requested_file = os.path.join('static', 'html', filename)
-        requested_file = os.path.join('.', requested_file)
-        file_size = os.path.getsize(requested_file)
-        print("\nRequested File: ", requested_file)
-
-        if not os.path.exists(requested_file):
-            return self.resource_not_found()
-        elif not has_permission_other(requested_file):
-            return self.resource_forbidden()
-        else:
-            header = f'HTTP/1.1 200 OK{NEWLINE}'
-            try:
-                file_extension = os.path.splitext(requested_file)[1][1:]
-                mime_type = get_file_mime_type(file_extension)
-            except KeyError:
-                mime_type = "text/plain"
-            header += f'Content-Length: {file_size}{NEWLINE}'
-            header += f'Content-type: {mime_type}{NEWLINE}'
-            header += f'Connection: close{NEWLINE}{NEWLINE}'
-            return header.encode("utf-8")
+    def body_sink(self, request):
+        """
+        Returns where to stream the body of `request` as it arrives, or
+        `None` to have it buffered. Bulk event uploads are ingested line by
+        line so their size doesn't matter.
+        """
+        if (self.app is None and self.events is not None and request.method == "POST"
+                and unquote(request.path) == "/EventLog/bulk"):
+            return BulkIngest(self.events, request.header("Content-Type"))
+        return None
+
+    def process_response(self, request, keep_alive=False):
+        """
+        Returns the response to `request`, profiled if a profiling run is
+        active (see `profiler.RequestProfiler`).
+        """
+        started = time.perf_counter()
+        try:
+            response = self.profiler.profile(self.route_request, request, keep_alive)
+        except Exception:
+            traceback.print_exc()
+            response = self.internal_error()
+        request.timings["handle"] = time.perf_counter() - started
+        return response
+
+    def route_request(self, request, keep_alive=False):
+        requested_file = unquote(request.path)[1:]
+        if self.app is not None and requested_file != 'metrics':
+            return self.app_response(request, keep_alive)
+        if request.method == "GET":
+            return self.get_request(requested_file, request, keep_alive)
+        if request.method == "HEAD":
+            return self.head_request(requested_file, request, keep_alive)
+        if request.method == "POST":
+            return self.post_request(requested_file, request, keep_alive)
+        return self.method_not_allowed(keep_alive)
+
+    def head_request(self, requested_file, request, keep_alive=False) -> HTTPResponse:
+        """
+        Responds to a HEAD request with the head of what a GET would get,
+        so dynamic routes answer it too.
+        """
+        response = self.get_request(requested_file, request, keep_alive)
+        response.parts = []
+        close_stream(response.stream)
+        response.stream = None
+        return response
 
     # TODO: Write the response to a GET request
-    def get_request(self, requested_file, data) -> bytes:
+    def get_request(self, requested_file, request, keep_alive=False) -> HTTPResponse:
         """
         Responds to a GET request with the associated bytes.
 
@@ -332,42 +1895,183 @@ class HTTPServer:
         send it back with a status set and appropriate mime type
         depending on `get_file_mime_type`.
         """
-        if requested_file.startswith('redirect'):
-            if '?' in requested_file:
-                _, query_string = requested_file.split('?', 1)
-                return redirect_handler(query_string)
+        if requested_file == 'redirect':
+            if request.query:
+                return redirect_handler(request.query, keep_alive)
             else:
-                return self.resource_not_found()
-
-        if requested_file.endswith('.html'):
-            filename = os.path.basename(requested_file)
-            requested_file = os.path.join('static', 'html', filename)
+                return self.resource_not_found(keep_alive)
+        if requested_file == 'EventLog' and self.events is not None:
+            return self.list_events(request, keep_alive)
+        if requested_file == 'api/stocks':
+            return self.stock_quote(request, keep_alive)
+        if requested_file == 'admin/profile' and self.admin:
+            return self.json_response("200 OK", self.profiler.status(), keep_alive)
+        if requested_file == 'metrics':
+            body = self.metrics.render().encode("utf-8")
+            return HTTPResponse(response_header("200 OK",
+                                                {"Content-Type": METRICS_CONTENT_TYPE,
+                                                 "Content-Length": len(body),
+                                                 "Cache-Control": "no-cache"},
+                                                keep_alive),
+                                [body])
 
-        requested_file = os.path.join('.', requested_file)
-        print("\nRequested File: ", requested_file)
+        started = time.perf_counter()
+        info = self.paths.resolve(requested_file)
+        request.timings["resolve"] = time.perf_counter() - started
 
-        if not os.path.exists(requested_file):
-            return self.resource_not_found()
-        elif not has_permission_other(requested_file):
-            return self.resource_forbidden()
+        if info is None:
+            return self.resource_not_found(keep_alive)
+        elif not info.readable:
+            return self.resource_forbidden(keep_alive)
         else:
-            header = f'HTTP/1.1 200 OK{NEWLINE}'
-            file_extension = None
-            try:
-                file_extension = os.path.splitext(requested_file)[1][1:]
-                mime_type = get_file_mime_type(file_extension)
-            except KeyError:
-                mime_type = "text/plain"
-            header += f'Content-type: {mime_type}{NEWLINE}'
-            header += f'Connection: close{NEWLINE}{NEWLINE}'
-            if should_return_binary(file_extension):
-                content = get_file_binary_contents(requested_file)
-            else:
-                content = get_file_contents(requested_file).encode("utf-8")
-            return header.encode("utf-8") + content
+            requested_file = info.path
+            file_stat = info.stat
+            file_extension = info.extension
+            mime_type = info.mime_type
+            headers = self.static_headers(info)
+            encoding = self.negotiate(request, file_extension, file_stat, headers)
+            if is_not_modified(request, headers["ETag"], file_stat):
+                return HTTPResponse(response_header("304 NOT MODIFIED", headers, keep_alive))
+
+            range_header = request.header("Range")
+            if range_header is not None and self.range_applies(request, headers):
+                ranges = parse_range(range_header, file_stat.st_size)
+                if ranges is not None:
+                    return self.range_response(requested_file, file_stat, mime_type,
+                                               headers, ranges, keep_alive)
+
+            if encoding is None and file_stat.st_size > self.sendfile_threshold:
+                header = response_header("200 OK",
+                                         {"Content-Length": file_stat.st_size,
+                                          "Content-type": mime_type,
+                                          **headers},
+                                         keep_alive)
+                return HTTPResponse(header, [(0, file_stat.st_size)], requested_file)
+
+            started = time.perf_counter()
+            head, content = self.file_response("200 OK", requested_file,
+                                               mime_type, file_stat, headers, encoding)
+            request.timings["read"] = time.perf_counter() - started
+            return HTTPResponse(finish_head(head, keep_alive), [content])
+
+    def negotiate(self, request, file_extension, file_stat, headers):
+        """
+        Picks the content coding to send a static file with, and updates its
+        `headers` to match. Returns `None` when the file is sent as-is.
+
+        Only text files small enough to cache are compressed, since their
+        compressed variants are built once and kept in the response cache.
+        Range requests always get the file as-is.
+        """
+        if (not should_compress(file_extension)
+                or not MIN_COMPRESS_SIZE <= file_stat.st_size <= MAX_CACHED_FILE_SIZE):
+            return None
+        headers["Vary"] = "Accept-Encoding"
+        if request.header("Range") is not None:
+            return None
+        encoding = negotiate_encoding(request.header("Accept-Encoding"))
+        if encoding is not None:
+            # Each variant is a different representation and needs its own tag
+            headers["ETag"] = headers["ETag"][:-1] + f'-{encoding}"'
+        return encoding
+
+    def static_headers(self, info):
+        """
+        Returns the validator and caching headers sent with the static file
+        `info` describes, which let browsers reuse their copy and revalidate
+        it with a conditional request.
+        """
+        return {"ETag": file_etag(info.stat),
+                "Last-Modified": http_date(info.stat.st_mtime),
+                "Cache-Control": info.cache_control,
+                "Accept-Ranges": "bytes"}
+
+    def range_applies(self, request, headers):
+        """
+        Returns `False` if the request's `If-Range` names another version of
+        the file, in which case the whole file is sent instead of the ranges.
+        """
+        if_range = request.header("If-Range")
+        return if_range is None or if_range in (headers["ETag"], headers["Last-Modified"])
+
+    def range_response(self, file_name, file_stat, mime_type, headers, ranges,
+                       keep_alive=False):
+        """
+        Responds with the `ranges` of `file_name` that the client asked for.
+        A single range is sent as-is, several ranges as a
+        `multipart/byteranges` body. The ranges are streamed from disk
+        with `sendfile` however big the file is.
+        """
+        file_size = file_stat.st_size
+        if not ranges:
+            return HTTPResponse(response_header("416 RANGE NOT SATISFIABLE",
+                                                {"Content-Range": f"bytes */{file_size}",
+                                                 "Content-Length": 0},
+                                                keep_alive))
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            header = response_header("206 PARTIAL CONTENT",
+                                     {"Content-Length": end - start + 1,
+                                      "Content-type": mime_type,
+                                      "Content-Range": f"bytes {start}-{end}/{file_size}",
+                                      **headers},
+                                     keep_alive)
+            return HTTPResponse(header, [(start, end - start + 1)], file_name)
+
+        boundary = token_hex(16)
+        parts = []
+        for start, end in ranges:
+            parts.append((f"{NEWLINE}--{boundary}{NEWLINE}"
+                          f"Content-Type: {mime_type}{NEWLINE}"
+                          f"Content-Range: bytes {start}-{end}/{file_size}"
+                          f"{NEWLINE}{NEWLINE}").encode("utf-8"))
+            parts.append((start, end - start + 1))
+        parts.append(f"{NEWLINE}--{boundary}--{NEWLINE}".encode("utf-8"))
+        content_length = sum(len(part) if isinstance(part, bytes) else part[1]
+                             for part in parts)
+        header = response_header("206 PARTIAL CONTENT",
+                                 {"Content-Length": content_length,
+                                  "Content-type": f"multipart/byteranges; boundary={boundary}",
+                                  **headers},
+                                 keep_alive)
+        return HTTPResponse(header, parts, file_name)
+
+    def file_response(self, status, file_name, mime_type, file_stat=None,
+                      headers=None, encoding=None):
+        """
+        Returns the `(head, body)` of a response sending `file_name`, from
+        the response cache when the file hasn't changed since it was cached.
+        Any extra `headers` are included in the cached head. With an
+        `encoding` from `content_encoders`, the body is compressed with it
+        unless that wouldn't make it smaller.
+
+        Text files are sent exactly as they are stored, so every file is read
+        as bytes and never decoded and re-encoded.
+        """
+        if file_stat is None:
+            file_stat = os.stat(file_name)
+        key = (status, file_name, encoding)
+        cached = self.cache.get(key, file_stat)
+        if cached is not None:
+            return cached
+
+        body = get_file_binary_contents(file_name)
+        headers = dict(headers or {})
+        if encoding is not None:
+            encoded = content_encoders[encoding](body)
+            if len(encoded) < len(body):
+                body = encoded
+                headers["Content-Encoding"] = encoding
+        head = encode_head(status, {"Content-Length": len(body),
+                                    "Content-type": mime_type,
+                                    **headers})
+        if file_stat.st_size <= MAX_CACHED_FILE_SIZE:
+            self.cache.put(key, file_stat, head, body)
+        return head, body
 
     # TODO: Write the response to a POST request
-    def post_request(self, requested_file: str, data: list) -> bytes:
+    def post_request(self, requested_file: str, request: HTTPRequest, keep_alive=False) -> HTTPResponse:
         """
         Responds to a POST request with an HTML page containing a table
         where each row corresponds to the field name, and field value from
@@ -390,88 +2094,646 @@ class HTTPServer:
         the contents of the POST request don't conform to what your form is 
         set to submit. In that case, you should ignore additional fields, 
         and also gracefully handle missing fields. 
+
+        When events are stored, an event the form wouldn't have sent isn't
+        stored: the page shows it with what's wrong, under a 400 (or the
+        errors as JSON, to clients that ask for it).
         """
-        content_length = 0
-        for line in data:
-            if line.lower().startswith('content-length'):
-                content_length = int(line.split(':')[1].strip())
-                break
+        if requested_file == 'EventLog/bulk':
+            if self.events is None:
+                return self.resource_not_found(keep_alive)
+            return self.bulk_ingest(request, keep_alive)
+        if requested_file == 'admin/profile' and self.admin:
+            return self.start_profiling(request, keep_alive)
 
-        body_lines = []
-        body_started = False
-        for line in data:
-            if line == '':
-                body_started = True
-                continue
-            if body_started:
-                body_lines.append(line)
-        post_data = "".join(body_lines)[:content_length]
-
-        parsed_data = {}
-        for pair in post_data.split("&"):
-            if "=" in pair:
-                key, value = pair.split("=", 1)
-                decoded_key = unquote(key)
-                decoded_value = unquote(value.replace("+", " "))
-                parsed_data[decoded_key] = decoded_value
-
-        html_content = ""
+        parsed_data = parse_form(request.body)
+
+        status = "200 OK"
+        segments = []
         if requested_file == 'EventLog':
-            html_content = submission_to_table(parsed_data)
+            # Events we store are held to the same rules as a bulk upload's
+            # records; otherwise the submission is only shown back
+            errors = validate_event(parsed_data) if self.events is not None else []
+            if errors and prefers_json(request):
+                return self.json_response("400 BAD REQUEST", {"errors": errors}, keep_alive)
+            if errors:
+                status = "400 BAD REQUEST"
+                segments = render_event_page([parsed_data], heading="Event Not Saved",
+                                             errors=errors)
+            else:
+                if self.events is not None:
+                    try:
+                        self.events.append(parsed_data)
+                    except StoreClosed:
+                        return self.handed_over(keep_alive)
+                segments = submission_to_table(parsed_data)
+
+        header = response_header(status, {"Content-Type": "text/html; charset=utf-8",
+                                            "Content-Length": sum(map(len, segments))},
+                                 keep_alive)
+        return HTTPResponse(header, segments)
+
+    def list_events(self, request, keep_alive=False) -> HTTPResponse:
+        """
+        Responds with a page of the stored events as JSON, e.g.
+        "/EventLog?day=Monday&from=09:00&to=17:00&offset=50&limit=50" lists
+        the second page of Monday's events starting between 9am and 5pm.
+        Every parameter is optional.
+        """
+        params = {key: values[-1] for key, values in parse_qs(request.query).items()}
+        try:
+            window = {}
+            for param in ("from", "to"):
+                if param in params:
+                    window[param] = minute_of_day(params[param])
+                    if window[param] is None:
+                        raise ValueError(f"{param} must be a time like 09:30")
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+            if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"offset must be at least 0 and limit 1 to {MAX_PAGE_SIZE}")
+        except ValueError as error:
+            return self.json_response("400 BAD REQUEST", {"error": str(error)}, keep_alive)
+
+        total, events = self.events.query(params.get("day"), window.get("from"),
+                                          window.get("to"), offset, limit)
+        return self.json_response("200 OK", {"total": total, "offset": offset,
+                                             "limit": limit, "events": events},
+                                  keep_alive)
+
+    def bulk_ingest(self, request, keep_alive=False) -> HTTPResponse:
+        """
+        Responds to a bulk upload of events to "/EventLog/bulk", one record
+        per line, with how many were accepted and why any were rejected.
+        The records were already stored while the body was streamed in
+        (see `body_sink`).
+        """
+        ingest = request.sink
+        if ingest is None:
+            ingest = BulkIngest(self.events, request.header("Content-Type"))
+            ingest.feed(request.body)
+            ingest.close()
+        if ingest.store_closed:
+            return self.json_response("503 SERVICE UNAVAILABLE", ingest.summary(), keep_alive,
+                                      {"Retry-After": RETRY_AFTER})
+        return self.json_response("200 OK", ingest.summary(), keep_alive)
+
+    def handed_over(self, keep_alive=False) -> HTTPResponse:
+        """Refuses an event posted after the event log went to a new server"""
+        return self.json_response("503 SERVICE UNAVAILABLE",
+                                  {"error": "the server is restarting; try again"},
+                                  keep_alive, {"Retry-After": RETRY_AFTER})
 
-        response = (
-            f"HTTP/1.1 200 OK{NEWLINE}"
-            f"Content-Type: text/html{NEWLINE}"
-            f"Connection: close{NEWLINE}{NEWLINE}"
-            f"{html_content}"
-        )
-        return response.encode("utf-8")
+    def stock_quote(self, request, keep_alive=False) -> HTTPResponse:
+        """
+        Responds to "/api/stocks?symbol=IBM" with the intraday quotes for
+        the symbol, as Alpha Vantage sends them, from the quote cache.
+        `X-Cache` tells whether the cache already had them.
+        """
+        params = {key: values[-1] for key, values in parse_qs(request.query).items()}
+        symbol = normalize_symbol(params.get("symbol", ""))
+        if symbol is None:
+            return self.json_response("400 BAD REQUEST",
+                                      {"Error Message": "symbol must be a ticker symbol"},
+                                      keep_alive)
+        try:
+            quote, status, max_age = self.quotes.get(symbol)
+        except UpstreamError as error:
+            return self.json_response("502 BAD GATEWAY", {"Error Message": str(error)},
+                                      keep_alive)
+        return self.json_response("200 OK", quote, keep_alive,
+                                  {"Cache-Control": f"max-age={max_age}", "X-Cache": status})
+
+    def start_profiling(self, request, keep_alive=False) -> HTTPResponse:
+        """
+        Starts profiling the next "?requests=N" requests, or every request
+        for "?seconds=S", and responds with the profiler's status. Only
+        served when the server was started with `admin` enabled.
+        """
+        params = {key: values[-1] for key, values in parse_qs(request.query).items()}
+        try:
+            requests = int(params["requests"]) if "requests" in params else None
+            seconds = float(params["seconds"]) if "seconds" in params else None
+        except ValueError:
+            return self.json_response("400 BAD REQUEST",
+                                      {"error": "requests and seconds must be numbers"},
+                                      keep_alive)
+        if not self.profiler.start(requests, seconds):
+            return self.json_response("409 CONFLICT", self.profiler.status(), keep_alive)
+        return self.json_response("202 ACCEPTED", self.profiler.status(), keep_alive)
 
-    def method_not_allowed(self) -> bytes:
+    def app_response(self, request, keep_alive=False) -> HTTPResponse:
+        """
+        Responds with what the mounted application returns for `request`,
+        or a 500 if it fails. A body of unknown length is sent chunked, or
+        to an HTTP/1.0 client by closing the connection after it.
+        """
+        try:
+            answer = self.app(request)
+        except Exception:
+            traceback.print_exc()
+            return self.internal_error()
+
+        # Framing is up to us, whatever the application says
+        headers = {name: value for name, value in answer.headers.items()
+                   if name.lower() not in ("connection", "transfer-encoding")}
+        has_length = any(name.lower() == "content-length" for name in headers)
+        include_body = request.method != "HEAD"
+        if not answer.streaming:
+            if not has_length:
+                headers["Content-Length"] = len(answer.body)
+            return HTTPResponse(response_header(answer.status, headers, keep_alive),
+                                [answer.body] if include_body else [])
+
+        stream = answer.body
+        close = False
+        if not include_body:
+            close_stream(answer.body)
+            stream = None
+        elif has_length:
+            pass
+        elif request.version == "HTTP/1.1":
+            headers["Transfer-Encoding"] = "chunked"
+            stream = encode_chunks(stream)
+        else:
+            close = True
+        return HTTPResponse(response_header(answer.status, headers, keep_alive and not close),
+                            stream=stream, close=close)
+
+    def json_response(self, status, data, keep_alive=False, headers=None) -> HTTPResponse:
+        body = json.dumps(data).encode("utf-8")
+        return HTTPResponse(response_header(status,
+                                            {"Content-Type": "application/json",
+                                             "Content-Length": len(body),
+                                             "Cache-Control": "no-cache",
+                                             **(headers or {})},
+                                            keep_alive),
+                            [body])
+
+    def bad_request(self, status) -> HTTPResponse:
+        """
+        Returns the error response for a request we refused to parse. The
+        connection is always closed after it, since we can't tell where
+        the next request would start.
+        """
+        return HTTPResponse(response_header(status, {"Content-Length": 0}))
+
+    def internal_error(self) -> HTTPResponse:
+        """
+        Returns the response to a request whose handler failed. The
+        connection is closed after it, since the failure may have left it
+        in any state.
+        """
+        return HTTPResponse(response_header("500 INTERNAL SERVER ERROR", {"Content-Length": 0}),
+                            close=True)
+
+    def method_not_allowed(self, keep_alive=False) -> HTTPResponse:
         """
         Returns 405 not allowed status and gives allowed methods.
         
         """
-        message = f"HTTP/1.1 405 METHOD NOT ALLOWED" \
-                  + NEWLINE + NEWLINE.join(["Allow: GET,POST, HEAD", "Connection: close"]) \
-                  + NEWLINE + NEWLINE
+        return HTTPResponse(response_header("405 METHOD NOT ALLOWED",
+                                            {"Allow": "GET, POST, HEAD", "Content-Length": 0},
+                                            keep_alive))
 
-        return message.encode("utf-8")
+    def error_page(self, status, page, keep_alive=False, include_body=True) -> HTTPResponse:
+        """
+        Returns an error response with `status`, sending back the `page` in
+        "static/html" as its body (or an empty body if that page is missing).
+        """
+        info = self.paths.lookup(os.path.join(self.paths.page_dir, page))
+        try:
+            if info is None:
+                raise FileNotFoundError(page)
+            head, body = self.file_response(status, info.path, "text/html", info.stat)
+        except FileNotFoundError:
+            print(f"{page} Not Found")
+            head, body = encode_head(status, {"Content-Type": "text/html",
+                                              "Content-Length": 0}), b""
+        return HTTPResponse(finish_head(head, keep_alive), [body] if include_body else [])
 
     # TODO: Make a function that handles not found error
-    def resource_not_found(self) -> bytes | None:
+    def resource_not_found(self, keep_alive=False, include_body=True) -> HTTPResponse:
         """
         Returns 404 not found status and sends back our 404.html page.
         """
-        content = ""
-        try:
-            content = get_file_contents(os.path.join('.', 'static', 'html', '404.html'))
-        except FileNotFoundError:
-            print("404 Not Found")
-        finally:
-            message = (f'HTTP/1.1 404 NOT FOUND{NEWLINE}'
-                       f'Content-Type: text/html{NEWLINE}'
-                       f'Connection: close{NEWLINE}{NEWLINE}'
-                       f'{content}').encode("utf-8")
-        return message
+        return self.error_page("404 NOT FOUND", "404.html", keep_alive, include_body)
 
     # TODO: Make a function that handles forbidden error
-    def resource_forbidden(self) -> bytes | None:
+    def resource_forbidden(self, keep_alive=False, include_body=True) -> HTTPResponse:
         """
         Returns 403 FORBIDDEN status and sends back our 403.html page.
         """
-        content = ""
+        return self.error_page("403 FORBIDDEN", "403.html", keep_alive, include_body)
+
+
+class DeferredSink:
+    """
+    Stands in for a body sink (see `RequestParser`) on the event loop: the
+    parser's `feed` and `close` calls are only queued, and `run`, called
+    from a worker thread, passes them on to the real `sink`.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.calls = []
+        self.closed = False
+
+    def feed(self, data):
+        self.calls.append(data)
+
+    def close(self):
+        self.calls.append(None)
+        self.closed = True
+
+    def run(self):
+        calls, self.calls = self.calls, []
+        for data in calls:
+            if data is None:
+                self.sink.close()
+            else:
+                self.sink.feed(data)
+
+    def __getattr__(self, name):
+        # Handlers see the real sink's other attributes, e.g. `summary`
+        return getattr(self.sink, name)
+
+
+def run_sinks(sinks):
+    """Passes on what each `DeferredSink` in `sinks` has queued"""
+    for sink in sinks:
+        sink.run()
+
+
+class AsyncHTTPServer(HTTPServer):
+    """
+    Serves the same routes as `HTTPServer` from a single asyncio event loop.
+
+    Idle keep-alive connections only cost a coroutine rather than a thread,
+    so many more of them can be held open at once. Building a response
+    reads files from disk, so `process_response` runs on a small thread
+    pool and the loop itself never blocks.
+    """
+
+    def create_executor(self, executor, workers, queue_size):
+        # Requests handed to the pool and not yet answered, counted on the loop
+        self.busy = 0
+        self.workers = workers
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def worker_usage(self):
+        busy = min(self.busy, self.workers)
+        return busy, self.workers, self.busy - busy
+
+    def accept(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.sock.setblocking(False)
+        server = await asyncio.start_server(self.handle_connection, sock=self.sock)
+        while not self.stopping.is_set():
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        server.close()
+        # The connections in flight need the loop running to finish
+        while ((self.admission.in_flight or self.admission.idle)
+               and time.monotonic() < self.drain_deadline):
+            await asyncio.sleep(0.05)
+
+    async def handle_connection(self, reader, writer):
+        """The event loop equivalent of `HTTPServer.accept_request`"""
+        loop = asyncio.get_running_loop()
+        ip = writer.get_extra_info("peername")[0]
+        rejection = self.admission.admit(ip)
+        if rejection is not None:
+            writer.write(rejection)
+            writer.close()
+            return
+
+        # Sinks may write to disk, so they run on the pool, not on the loop
+        sinks = []
+
+        def body_sink(request):
+            sink = self.body_sink(request)
+            if sink is None:
+                return None
+            sinks.append(DeferredSink(sink))
+            return sinks[-1]
+
+        parser = RequestParser(self.max_header_size, self.max_body_size, body_sink)
+        served = 0
+        resting = False
+        keep_alive = True
+        phase = deadline = None
+        try:
+            while keep_alive:
+                phase, deadline = self.read_deadline(parser, phase, deadline)
+                # A connection accepted just before stopping still gets its
+                # first request answered, if it sends one without delay
+                if phase == "request" and served and self.stopping.is_set():
+                    break
+                if phase == "request" and served and not resting:
+                    if not self.admission.rest():
+                        break
+                    resting = True
+                remaining = deadline - time.monotonic()
+                if phase == "request" and remaining > 0:
+                    remaining = min(remaining, DRAIN_POLL_INTERVAL)
+                try:
+                    chunk = await asyncio.wait_for(reader.read(65536), remaining)
+                except asyncio.TimeoutError:
+                    if phase == "request" and self.stopping.is_set():
+                        break
+                    if phase == "request" and time.monotonic() < deadline:
+                        continue
+                    raise
+                if not chunk:
+                    break
+                if resting:
+                    resting = False
+                    self.admission.resume()
+                try:
+                    requests = parser.feed(chunk)
+                except RequestError as error:
+                    phase = None
+                    await self.write_response(writer, self.bad_request(error.status))
+                    break
+                if sinks:
+                    await loop.run_in_executor(self.executor, run_sinks, sinks)
+                    sinks[:] = [sink for sink in sinks if not sink.closed]
+
+                if requests:
+                    phase = None
+                for req in requests:
+                    served += 1
+                    keep_alive = (req.keep_alive and served < self.max_keep_alive_requests
+                                  and not self.stopping.is_set())
+                    start = time.perf_counter()
+                    self.busy += 1
+                    try:
+                        response = await loop.run_in_executor(
+                            self.executor, self.process_response, req, keep_alive)
+                    finally:
+                        self.busy -= 1
+                    keep_alive = keep_alive and not response.close
+                    sending = time.perf_counter()
+                    await self.write_response(writer, response)
+                    req.timings["send"] = time.perf_counter() - sending
+                    self.record(req, response, start, ip)
+                    if not keep_alive:
+                        break
+                if keep_alive and parser.send_continue:
+                    parser.send_continue = False
+                    writer.write(CONTINUE)
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+        except asyncio.TimeoutError:
+            if phase in ("head", "body"):
+                writer.write(REQUEST_TIMEOUT)
+        except ConnectionError:
+            pass
+        except Exception:
+            traceback.print_exc()
+            if phase is not None:
+                writer.write(self.internal_error().head)
+        finally:
+            self.admission.release(ip, resting)
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), self.write_timeout)
+            except (asyncio.TimeoutError, ConnectionError):
+                pass
+
+    async def write_response(self, writer, response):
+        """
+        The event loop equivalent of `send_response`. Each write gives up
+        after `write_timeout` seconds.
+        """
+        loop = asyncio.get_running_loop()
+        buffers = [response.head]
+        f = None
         try:
-            content = get_file_contents(os.path.join('.', 'static', 'html', '403.html'))
-        except FileNotFoundError:
-            print("404 Not Found")
+            for part in response.parts:
+                if not isinstance(part, tuple):
+                    buffers.append(part)
+                    continue
+                writer.writelines(buffers)
+                buffers = []
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+                if f is None:
+                    f = open(response.file_name, "rb")
+                offset, count = part
+                sent = await asyncio.wait_for(
+                    loop.sendfile(writer.transport, f, offset, count), self.write_timeout)
+                if sent < count:
+                    raise ConnectionError(f"{response.file_name} changed while sending")
+            writer.writelines(buffers)
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+            if response.stream is not None:
+                chunks = iter(response.stream)
+                while True:
+                    # Producing the next chunk may block, so not on the loop
+                    chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+                    if chunk is None:
+                        break
+                    buffers = chunk if isinstance(chunk, list) else [chunk]
+                    writer.writelines(buffers)
+                    response.streamed += sum(map(len, buffers))
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
         finally:
-            message = (f'HTTP/1.1 403 FORBIDDEN{NEWLINE}'
-                       f'Content-Type: text/html{NEWLINE}'
-                       f'Connection: close{NEWLINE}{NEWLINE}'
-                       f'{content}').encode("utf-8")
-        return message
+            if f is not None:
+                f.close()
+            close_stream(response.stream)
+
+
+class PreforkSupervisor:
+    """
+    Runs `processes` copies of a server engine in forked worker processes
+    that all accept connections on the same port, so the server is no
+    longer limited to one core by the GIL.
+
+    Where the platform has `SO_REUSEPORT`, every worker binds its own
+    socket and the kernel balances connections between them. Otherwise the
+    supervisor binds a single socket that the workers inherit.
+
+    Workers that die are restarted. SIGINT or SIGTERM tells the workers to
+    drain their connections and stop, and the supervisor exits once they
+    have. Each worker writes its own access log, named after its pid (see
+    `access_log.process_log_path`).
+    """
+
+    # A worker that dies sooner than this after starting is restarted only
+    # after waiting this long, so a crashing worker can't fork-bomb us.
+    RESTART_DELAY = 1
+
+    def __init__(self, engine, processes=None, host="localhost", port=4131,
+                 **server_options):
+        self.engine = engine
+        self.processes = processes or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.server_options = server_options
+        self.reuse_port = hasattr(socket, "SO_REUSEPORT")
+        self.sock = None
+        self.children = {}
+        self.stopping = False
+
+    def run(self):
+        if not self.reuse_port:
+            self.sock = listening_socket(self.host, self.port)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        for _ in range(self.processes):
+            self.spawn()
+        while self.children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            started = self.children.pop(pid, None)
+            if started is not None and not self.stopping:
+                if time.monotonic() - started < self.RESTART_DELAY:
+                    time.sleep(self.RESTART_DELAY)
+                # We may have been told to stop while waiting
+                if not self.stopping:
+                    self.spawn()
+
+        if self.sock is not None:
+            self.sock.close()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.monotonic()
+            return
+        # In the worker: Ctrl-C reaches the whole process group, but only the
+        # supervisor should act on it and tell us to stop with SIGTERM.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        status = 1
+        options = dict(self.server_options)
+        if options.get("access_log") is not None:
+            options["access_log"] = process_log_path(options["access_log"])
+        try:
+            self.engine(host=self.host, port=self.port, sock=self.sock,
+                        reuse_port=self.reuse_port, stop_signals=(signal.SIGTERM,),
+                        **options)
+            status = 0
+        finally:
+            os._exit(status)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+# The serving engines that can be picked with `--engine` at startup
+engines = {
+    "threaded": HTTPServer,
+    "asyncio": AsyncHTTPServer,
+}
+
+
+def main():
+    parser = ArgumentParser(description="Serve the homework site over HTTP")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=4131)
+    parser.add_argument("--engine", choices=engines, default="threaded")
+    parser.add_argument("--executor", choices=("pool", "thread"), default="pool")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--sendfile-threshold", type=int, default=SENDFILE_THRESHOLD,
+                        help="send files bigger than this many bytes with sendfile")
+    parser.add_argument("--header-timeout", type=float, default=HEADER_TIMEOUT)
+    parser.add_argument("--body-timeout", type=float, default=BODY_TIMEOUT)
+    parser.add_argument("--write-timeout", type=float, default=WRITE_TIMEOUT)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT,
+                        help="connections served at once before answering 503")
+    parser.add_argument("--max-per-ip", type=int, default=MAX_CONNECTIONS_PER_IP,
+                        help="connections from one address before answering 429")
+    parser.add_argument("--max-idle", type=int, default=MAX_IDLE_CONNECTIONS,
+                        help="idle keep-alive connections kept open between requests")
+    parser.add_argument("--event-log", default=EVENT_LOG_PATH,
+                        help="file to store posted events in")
+    parser.add_argument("--no-event-log", dest="event_log", action="store_const",
+                        const=None, help="show posted events back without storing them")
+    parser.add_argument("--access-log", default=ACCESS_LOG_PATH,
+                        help="file to write the access log to (with --prefork, each "
+                             "worker adds its pid to the name)")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_const",
+                        const=None, help="don't write an access log")
+    parser.add_argument("--admin", action="store_true",
+                        help="serve the /admin/profile endpoint")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR,
+                        help="directory to write profiles to")
+    parser.add_argument("--profile-requests", type=int, default=DEFAULT_PROFILE_REQUESTS,
+                        help="number of requests profiled after SIGUSR1")
+    parser.add_argument("--stock-upstream",
+                        help="URL of a stub quote server or directory of SYMBOL.json "
+                             "fixtures to use instead of Alpha Vantage")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT,
+                        help="seconds in-flight requests get to finish when stopping")
+    parser.add_argument("--app", metavar="MODULE:NAME",
+                        help="serve this application (see apps.py) instead of our own routes")
+    parser.add_argument("--handle-req", metavar="MODULE:NAME",
+                        help="serve this handle_req(url, body) function, e.g. server:handle_req")
+    parser.add_argument("--assets", action="store_true",
+                        help="bundle the pages' CSS and JavaScript at startup (see assets.py)")
+    parser.add_argument("--prefork", action="store_true",
+                        help="run the engine in several worker processes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="number of worker processes with --prefork")
+    args = parser.parse_args()
+    if args.prefork and args.event_log is not None:
+        # Each worker would keep its own index and interleave its writes
+        # with the others'
+        parser.error("the event log can't be shared between --prefork workers; "
+                     "add --no-event-log")
+    if args.app and args.handle_req:
+        parser.error("--app and --handle-req can't be used together")
+    app = None
+    if args.app:
+        app = load_app(args.app)
+    elif args.handle_req:
+        app = HandleReqApp(load_app(args.handle_req))
+
+    options = dict(host=args.host, port=args.port, executor=args.executor,
+                   workers=args.workers, queue_size=args.queue_size,
+                   sendfile_threshold=args.sendfile_threshold,
+                   header_timeout=args.header_timeout, body_timeout=args.body_timeout,
+                   write_timeout=args.write_timeout, max_in_flight=args.max_in_flight,
+                   max_per_ip=args.max_per_ip, max_idle=args.max_idle,
+                   stock_upstream=args.stock_upstream, event_log=args.event_log,
+                   access_log=args.access_log,
+                   profiler=RequestProfiler(args.profile_dir), admin=args.admin,
+                   drain_timeout=args.drain_timeout, app=app)
+    if args.assets:
+        # Built once here, before any worker processes are forked
+        bundles = build_assets()
+        print(f"Built {len(bundles)} asset bundles into {ASSET_DIR}")
+        options["page_dir"] = ASSET_PAGE_DIR
+
+    # `kill -USR1 <pid>` profiles the next requests (with --prefork, signal
+    # the worker processes, which inherit this handler)
+    profiler = options["profiler"]
+    signal.signal(signal.SIGUSR1,
+                  lambda signum, frame: profiler.start(requests=args.profile_requests))
+
+    if args.prefork:
+        PreforkSupervisor(engines[args.engine], args.processes, **options).run()
+    else:
+        # SIGINT/SIGTERM drain and stop; SIGHUP restarts without dropping
+        # connections, handing the listening socket to the new process.
+        try:
+            engines[args.engine](sock=inherited_socket(),
+                                 stop_signals=(signal.SIGINT, signal.SIGTERM),
+                                 restart_signal=signal.SIGHUP, **options)
+        except StoreLocked as error:
+            sys.exit(f"{error}; use another --event-log")
 
 
 if __name__ == "__main__":
-    HTTPServer()
+    main()
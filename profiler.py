@@ -0,0 +1,138 @@
+"""
+On-demand profiling of the requests `myServerStudent.py` answers.
+
+A profiling run is started at runtime, by a signal or the admin endpoint,
+for a number of requests or seconds. Requests are profiled one at a time,
+each with its own `cProfile.Profile`: from Python 3.12 cProfile is built on
+`sys.monitoring`, which only lets one profiler be active in a process. A
+request that arrives while another is being profiled runs unprofiled, so
+a run samples the requests it covers rather than taking the next ones in
+a row. Their statistics are merged and written to disk as a `pstats` dump
+when the run ends. While no run is active, profiling costs a single
+attribute check per request.
+"""
+
+import cProfile
+import os
+import pstats
+import time
+from threading import Lock, Timer
+
+PROFILE_DIR = "profiles"
+
+# What a profiling run started without a limit covers
+DEFAULT_PROFILE_REQUESTS = 1000
+
+
+class RequestProfiler:
+    """
+    Profiles the calls made through `profile` while a run is active, and
+    writes each run's merged statistics to a file in `directory`. The path
+    of the last file written is kept in `last_dump`.
+    """
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.lock = Lock()
+        self.active = False
+        self.run = 0
+        self.limit = None
+        self.claimed = 0
+        self.completed = 0
+        # Whether a request is being profiled right now
+        self.busy = False
+        self.stats = None
+        self.timer = None
+        self.last_dump = None
+
+    def start(self, requests=None, seconds=None):
+        """
+        Starts a run covering the next `requests` requests, or every request
+        for `seconds`. Returns `False` if a run is already active.
+        """
+        if requests is None and seconds is None:
+            requests = DEFAULT_PROFILE_REQUESTS
+        with self.lock:
+            if self.active:
+                return False
+            self.run += 1
+            self.limit = requests
+            self.claimed = self.completed = 0
+            self.stats = None
+            self.active = True
+            if seconds is not None:
+                self.timer = Timer(seconds, self.finish, args=(self.run,))
+                self.timer.daemon = True
+                self.timer.start()
+        return True
+
+    def profile(self, function, *args):
+        """
+        Returns `function(*args)`, profiled if a run wants this call and no
+        other call is being profiled
+        """
+        if not self.active or self.busy:
+            return function(*args)
+        with self.lock:
+            if (not self.active or self.busy
+                    or (self.limit is not None and self.claimed >= self.limit)):
+                run = None
+            else:
+                run = self.run
+                self.claimed += 1
+                self.busy = True
+        if run is None:
+            return function(*args)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Some other profiling tool, e.g. a debugger, is already active
+            with self.lock:
+                self.busy = False
+                self.claimed -= 1
+            return function(*args)
+        try:
+            return function(*args)
+        finally:
+            profile.disable()
+            self.collect(run, profile)
+
+    def collect(self, run, profile):
+        with self.lock:
+            self.busy = False
+            # A timed run may have ended while this call was profiled
+            if run != self.run or not self.active:
+                return
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.completed += 1
+            done = self.limit is not None and self.completed >= self.limit
+        if done:
+            self.finish(run)
+
+    def finish(self, run):
+        """Ends run number `run`, writing out what it collected"""
+        with self.lock:
+            if run != self.run or not self.active:
+                return
+            self.active = False
+            stats, self.stats = self.stats, None
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if stats is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory,
+                            f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{run}.pstats")
+        stats.dump_stats(path)
+        self.last_dump = path
+
+    def status(self):
+        with self.lock:
+            return {"active": self.active, "requests": self.limit,
+                    "profiled": self.completed, "last_dump": self.last_dump}
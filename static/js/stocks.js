@@ -1,7 +1,9 @@
-const API_KEY = "X9T8SI5I4AJB2X87";
+// Quotes come from our server, which caches them and fetches them from
+// Alpha Vantage with its own key.
+const STOCKS_API = "/api/stocks";
 
 async function getData(ticker_symbol) {
-    const url = `https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol=${ticker_symbol}&interval=5min&apikey=${API_KEY}`;
+    const url = `${STOCKS_API}?symbol=${encodeURIComponent(ticker_symbol)}`;
     try {
         const response = await fetch(url);
         return await response.json();
@@ -0,0 +1,217 @@
+"""
+Stock quotes for "stocks.html", fetched by the server instead of by every
+browser.
+
+`QuoteCache` keeps each symbol's latest quote for a while, so repeated
+lookups of the same symbol cost one upstream request rather than one per
+visitor and stay clear of the upstream rate limit. The upstream is any
+callable taking a symbol and returning the decoded JSON quote, so a local
+stub server or a directory of fixture files can stand in for Alpha Vantage.
+"""
+
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+# Set ALPHAVANTAGE_API_KEY to use your own key instead of the site's
+DEFAULT_API_KEY = "X9T8SI5I4AJB2X87"
+
+# How long (in seconds) to wait for the upstream to answer
+UPSTREAM_TIMEOUT = 10
+
+# A quote is served from the cache for `QUOTE_TTL` seconds. For
+# `QUOTE_STALE_TTL` seconds after that it is still served, while a fresh one
+# is fetched in the background.
+QUOTE_TTL = 60
+QUOTE_STALE_TTL = 600
+QUOTE_CACHE_ENTRIES = 1024
+
+# How long (in seconds) a lookup waits for another's fetch of the same symbol
+FLIGHT_TIMEOUT = 2 * UPSTREAM_TIMEOUT
+
+# Ticker symbols look like "IBM", "BRK.B" or "RDS-A"
+SYMBOL_PATTERN = re.compile(r"[A-Z0-9][A-Z0-9.\-]{0,9}")
+
+
+class UpstreamError(Exception):
+    """Raised when no quote could be fetched for a symbol"""
+
+
+def normalize_symbol(symbol):
+    """Returns `symbol` in upper case, or `None` if it isn't a ticker symbol"""
+    symbol = symbol.strip().upper()
+    return symbol if SYMBOL_PATTERN.fullmatch(symbol) else None
+
+
+def is_cacheable(quote):
+    """
+    Returns `False` for Alpha Vantage's rate limit notices, which say
+    nothing about the symbol and mustn't replace a real quote.
+    """
+    return isinstance(quote, dict) and "Note" not in quote and "Information" not in quote
+
+
+class AlphaVantageUpstream:
+    """
+    Fetches intraday quotes from Alpha Vantage, or from a stub server that
+    answers the same queries at `base_url`.
+    """
+
+    def __init__(self, base_url=ALPHA_VANTAGE_URL, api_key=None, timeout=UPSTREAM_TIMEOUT):
+        self.base_url = base_url
+        self.api_key = api_key or os.environ.get("ALPHAVANTAGE_API_KEY", DEFAULT_API_KEY)
+        self.timeout = timeout
+
+    def __call__(self, symbol):
+        query = urlencode({"function": "TIME_SERIES_INTRADAY", "symbol": symbol,
+                           "interval": "5min", "apikey": self.api_key})
+        with urlopen(f"{self.base_url}?{query}", timeout=self.timeout) as response:
+            return json.load(response)
+
+
+class FixtureUpstream:
+    """
+    Reads quotes from "`directory`/SYMBOL.json" files. Symbols without a
+    file get the error Alpha Vantage sends for unknown symbols.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, symbol):
+        try:
+            with open(os.path.join(self.directory, f"{symbol}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"Error Message": f"Invalid API call. No quotes for {symbol}."}
+
+
+def make_upstream(source=None):
+    """
+    Returns the upstream for `source`: a directory of fixture files, the
+    URL of a stub server, or Alpha Vantage itself when `source` is `None`.
+    A `source` that is already an upstream is returned as-is.
+    """
+    if callable(source):
+        return source
+    if source is None:
+        return AlphaVantageUpstream()
+    if os.path.isdir(source):
+        return FixtureUpstream(source)
+    return AlphaVantageUpstream(base_url=source)
+
+
+class Flight:
+    """An upstream fetch in progress, which every caller missing the symbol waits for"""
+
+    def __init__(self):
+        self.done = Event()
+        self.quote = None
+        self.error = None
+
+
+class QuoteCache:
+    """
+    Caches the quotes fetched by `upstream` for each symbol, keeping at most
+    `max_entries` symbols.
+
+    Concurrent misses for the same symbol share a single upstream fetch.
+    A quote older than `ttl` seconds but younger than `ttl + stale_ttl` is
+    still returned straight away while it is refreshed in the background,
+    and any quote we have is returned if the upstream fails. A lookup waits
+    at most `flight_timeout` seconds for a fetch started by another.
+    """
+
+    def __init__(self, upstream, ttl=QUOTE_TTL, stale_ttl=QUOTE_STALE_TTL,
+                 max_entries=QUOTE_CACHE_ENTRIES, flight_timeout=FLIGHT_TIMEOUT):
+        self.upstream = upstream
+        self.flight_timeout = flight_timeout
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def get(self, symbol):
+        """
+        Returns `(quote, status, max_age)` for `symbol`. `status` is "HIT",
+        "STALE" or "MISS", and `max_age` is how many more seconds the quote
+        is fresh for. Raises `UpstreamError` if there is no quote to return.
+        """
+        with self.lock:
+            entry = self.entries.get(symbol)
+            if entry is not None:
+                self.entries.move_to_end(symbol)
+                age = time.monotonic() - entry[0]
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry[1], "HIT", int(self.ttl - age)
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if symbol not in self.in_flight:
+                        flight = self.in_flight[symbol] = Flight()
+                        Thread(target=self.fetch, args=(symbol, flight), daemon=True).start()
+                    return entry[1], "STALE", 0
+
+            flight = self.in_flight.get(symbol)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[symbol] = Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self.fetch(symbol, flight)
+        elif not flight.done.wait(self.flight_timeout):
+            if entry is not None:
+                return entry[1], "STALE", 0
+            raise UpstreamError(f"Timed out waiting for a quote for {symbol}")
+
+        if flight.error is None and is_cacheable(flight.quote):
+            return flight.quote, "MISS", int(self.ttl)
+        if entry is not None:
+            # Better an old quote than an error or a rate limit notice
+            return entry[1], "STALE", 0
+        if flight.error is not None:
+            raise flight.error
+        return flight.quote, "MISS", 0
+
+    def fetch(self, symbol, flight):
+        try:
+            flight.quote = self.upstream(symbol)
+        except Exception as error:
+            # Not only `OSError`: e.g. `http.client.IncompleteRead` isn't one
+            flight.error = UpstreamError(f"Could not fetch {symbol}: {error}")
+        finally:
+            # Whatever happened, the flight must end, or every later lookup
+            # of the symbol would wait for it
+            with self.lock:
+                del self.in_flight[symbol]
+                if flight.error is not None:
+                    self.errors += 1
+                elif is_cacheable(flight.quote):
+                    self.entries[symbol] = (time.monotonic(), flight.quote)
+                    self.entries.move_to_end(symbol)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            flight.done.set()
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits,
+                    "stale_hits": self.stale_hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "errors": self.errors}
@@ -0,0 +1,164 @@
+"""
+Precompiled HTML templates shared by `myServerStudent.py` and `server.py`.
+
+A template is split into byte segments when this module is imported, so
+rendering one only escapes and encodes the values filled in per request and
+returns a list of segments that can be written out without first being
+joined into one big string.
+"""
+
+import re
+from html import escape
+from urllib.parse import urlsplit
+
+# Placeholders look like `{{name}}`
+PLACEHOLDER = re.compile(r"{{(\w+)}}")
+
+# URL schemes allowed in links built from submitted values. Anything else
+# (e.g. "javascript:") is replaced with a harmless link.
+SAFE_URL_SCHEMES = {"", "http", "https", "mailto"}
+
+
+class Template:
+    """
+    An HTML template whose literal text is encoded once, up front.
+
+    `render` fills each `{{name}}` placeholder from its keyword arguments.
+    Strings are HTML-escaped and encoded; a list of byte segments (such as
+    another template's output) is inserted as-is.
+    """
+
+    def __init__(self, source):
+        self.segments = []
+        for i, part in enumerate(PLACEHOLDER.split(source)):
+            # `split` alternates between literal text and placeholder names
+            if i % 2:
+                self.segments.append(part)
+            elif part:
+                self.segments.append(part.encode("utf-8"))
+
+    def render(self, **values):
+        rendered = []
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                rendered.append(segment)
+                continue
+            value = values[segment]
+            if isinstance(value, list):
+                rendered.extend(value)
+            else:
+                rendered.append(escape(str(value), quote=True).encode("utf-8"))
+        return rendered
+
+
+def safe_url(url):
+    """Returns `url`, or "#" if following it could run script in the page"""
+    try:
+        scheme = urlsplit(url.strip()).scheme.lower()
+    except ValueError:
+        return "#"
+    return url if scheme in SAFE_URL_SCHEMES else "#"
+
+
+EVENT_ROW = Template('''
+                            <tr>
+                                <td>{{event}}</td>
+                                <td>{{day}}</td>
+                                <td>{{start}}</td>
+                                <td>{{end}}</td>
+                                <td>{{phone}}</td>
+                                <td>{{location}}</td>
+                                <td><a href="{{url}}">More Info</a></td>
+                            </tr>''')
+
+ERROR_LIST = Template('''
+            <ul class="errors">{{items}}
+            </ul>''')
+
+ERROR_ITEM = Template('''
+                <li>{{error}}</li>''')
+
+EVENT_PAGE = Template('''
+    <!DOCTYPE html>
+    <html lang="en">
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>Event Submission</title>
+            <link rel="stylesheet" href="/css/styles.css">
+        </head>
+        <body>
+            <nav class="navbar">
+                <a href="/" class="logo"><img src="/img/favicon.ico" alt="CSCI4131 icon"></a>
+                <div class="nav-links">
+                    <a href="/aboutme">About Me</a>
+                    <a href="/myschedule">My Schedule</a>
+                    <a href="/myform">Form Input</a>
+                </div>
+            </nav>
+            <h1>{{heading}}</h1>{{errors}}
+            <div class="main schedule-main" style="display: block; position: relative;">
+                <div class="main-left" style="width: 100%;">
+                    <table>
+                        <thead>
+                            <tr>
+                                <th>Event</th>
+                                <th>Day</th>
+                                <th>Start</th>
+                                <th>End</th>
+                                <th>Phone</th>
+                                <th>Location</th>
+                                <th>URL</th>
+                            </tr>
+                        </thead>
+                        <tbody>{{rows}}
+                        </tbody>
+                    </table>
+                </div>
+            </div>
+            <footer>
+                <div class="footer-container">
+                    <div class="footer-left">
+                        <div class="footer-links">
+                            <a href="https://www.linkedin.com/in/gustavo-sakamoto-de-toledo-3120a0240/">LinkedIn</a>
+                            <a href="mailto:gustavosakamotox@gmail.com">Email</a>
+                            <a href="https://www.instagram.com/gustavo.sakamoto.toledo/">Instagram</a>
+                        </div>
+                    </div>
+                </div>
+                <p>&copy; Copyright 2025 by Gustavo Sakamoto de Toledo</p>
+            </footer>
+        </body>
+    </html>
+    ''')
+
+
+def render_event_row(event):
+    """
+    Returns the byte segments of one table row for an `event` dictionary.
+    Missing fields are left empty.
+    """
+    return EVENT_ROW.render(event=event.get("event", ""),
+                            day=event.get("day", ""),
+                            start=event.get("start", ""),
+                            end=event.get("end", ""),
+                            phone=event.get("phone", ""),
+                            location=event.get("location", ""),
+                            url=safe_url(event.get("url", "")))
+
+
+def render_event_page(events, heading="My New Event", errors=()):
+    """
+    Returns the byte segments of the event page listing `events`, with a
+    list of `errors` under the heading if there are any.
+    """
+    rows = []
+    for event in events:
+        rows.extend(render_event_row(event))
+    error_list = []
+    if errors:
+        items = []
+        for error in errors:
+            items.extend(ERROR_ITEM.render(error=error))
+        error_list = ERROR_LIST.render(items=items)
+    return EVENT_PAGE.render(heading=heading, errors=error_list, rows=rows)
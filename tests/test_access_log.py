@@ -0,0 +1,55 @@
+import json
+import os
+
+from access_log import AccessLog, process_log_path
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_writes_one_json_record_per_request(tmp_path):
+    path = str(tmp_path / "access.log")
+    log = AccessLog(path, flush_interval=60)
+    log.log("10.0.0.1", "GET", "/index.html", 200, 512, 0.0125, {"parse": 0.001})
+    log.close()
+    [record] = read_records(path)
+    assert record["time"].endswith("Z")
+    assert {key: record[key] for key in record if key != "time"} == {
+        "client": "10.0.0.1", "method": "GET", "path": "/index.html", "status": 200,
+        "bytes": 512, "duration_ms": 12.5, "phases_ms": {"parse": 1.0}}
+    assert log.written == 1
+
+
+def test_drops_records_once_the_buffer_is_full(tmp_path):
+    path = str(tmp_path / "access.log")
+    # The writer sleeps through the test, so nothing leaves the buffer
+    log = AccessLog(path, capacity=3, flush_interval=60)
+    for i in range(5):
+        log.log("10.0.0.1", "GET", f"/{i}", 200, 0, 0.001)
+    assert log.dropped == 2
+    log.close()
+    assert [record["path"] for record in read_records(path)] == ["/0", "/1", "/2"]
+
+
+def test_rotates_past_max_bytes(tmp_path):
+    path = str(tmp_path / "access.log")
+    log = AccessLog(path, flush_interval=60, max_bytes=1, backups=2)
+    log.closed.set()
+    log.writer.join()
+    for i in range(4):
+        log.log("10.0.0.1", "GET", f"/{i}", 200, 0, 0.001)
+        log.flush()
+    log.close()
+    # Each flush went over the limit, so only the newest two are kept
+    assert os.path.getsize(path) == 0
+    assert [r["path"] for r in read_records(path + ".1")] == ["/3"]
+    assert [r["path"] for r in read_records(path + ".2")] == ["/2"]
+    assert not os.path.exists(path + ".3")
+
+
+def test_process_log_path():
+    assert process_log_path("logs/access.log", pid=1234) == "logs/access.1234.log"
+    assert process_log_path("access", pid=7) == "access.7"
+    assert process_log_path("access.log") == f"access.{os.getpid()}.log"
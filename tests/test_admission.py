@@ -0,0 +1,54 @@
+from myServerStudent import SERVICE_UNAVAILABLE, TOO_MANY_CONNECTIONS, AdmissionControl
+
+
+def test_sheds_past_max_in_flight():
+    admission = AdmissionControl(max_in_flight=2, max_per_ip=None)
+    assert admission.admit("10.0.0.1") is None
+    assert admission.admit("10.0.0.2") is None
+    assert admission.admit("10.0.0.3") == SERVICE_UNAVAILABLE
+    assert SERVICE_UNAVAILABLE.startswith(b"HTTP/1.1 503 ")
+    admission.release("10.0.0.1")
+    assert admission.admit("10.0.0.3") is None
+    assert admission.rejected == 1
+
+
+def test_limits_connections_per_address():
+    admission = AdmissionControl(max_in_flight=None, max_per_ip=2)
+    assert admission.admit("10.0.0.1") is None
+    assert admission.admit("10.0.0.1") is None
+    assert admission.admit("10.0.0.1") == TOO_MANY_CONNECTIONS
+    assert TOO_MANY_CONNECTIONS.startswith(b"HTTP/1.1 429 ")
+    assert admission.admit("10.0.0.2") is None
+    admission.release("10.0.0.1")
+    admission.release("10.0.0.1")
+    assert "10.0.0.1" not in admission.per_ip
+
+
+def test_idle_connections_do_not_count_as_in_flight():
+    admission = AdmissionControl(max_in_flight=1, max_per_ip=None, max_idle=2)
+    assert admission.admit("10.0.0.1") is None
+    assert admission.rest()
+    assert (admission.in_flight, admission.idle) == (0, 1)
+    # The idle client no longer keeps a busy one out
+    assert admission.admit("10.0.0.2") is None
+    assert admission.admit("10.0.0.3") == SERVICE_UNAVAILABLE
+
+    admission.release("10.0.0.2")
+    admission.resume()
+    assert (admission.in_flight, admission.idle) == (1, 0)
+    assert admission.rest()
+    admission.release("10.0.0.1", idle=True)
+    assert (admission.in_flight, admission.idle) == (0, 0)
+    assert admission.per_ip == {}
+
+
+def test_rest_refused_past_max_idle():
+    admission = AdmissionControl(max_in_flight=None, max_per_ip=None, max_idle=1)
+    admission.admit("10.0.0.1")
+    admission.admit("10.0.0.2")
+    assert admission.rest()
+    assert not admission.rest()
+    # The refused connection is still in flight, and is released as such
+    assert (admission.in_flight, admission.idle) == (1, 1)
+    admission.release("10.0.0.2")
+    assert admission.in_flight == 0
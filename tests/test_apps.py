@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from apps import HandleReqApp, Response, load
+
+
+def request(method, target="/echo?x=1", body=b""):
+    return SimpleNamespace(method=method, target=target, body=body)
+
+
+def echo(url, body):
+    return f"{url} {body!r}", "text/plain; charset=utf-8"
+
+
+def test_response_body_types():
+    assert Response(body="café").body == "café".encode("utf-8")
+    assert not Response(body=b"x").streaming
+    assert Response(body=iter([b"x"])).streaming
+
+
+def test_handle_req_gets_target_and_decoded_post_body():
+    app = HandleReqApp(echo)
+    response = app(request("POST", body="name=café".encode("utf-8")))
+    assert response.status == "200 OK"
+    assert response.body == "/echo?x=1 'name=café'".encode("utf-8")
+    assert response.headers == {"Content-Type": "text/plain; charset=utf-8",
+                                "X-Content-Type-Options": "nosniff"}
+    assert app(request("GET")).body == b"/echo?x=1 None"
+
+
+def test_other_methods_are_not_allowed():
+    response = HandleReqApp(echo)(request("DELETE"))
+    assert response.status == "405 METHOD NOT ALLOWED"
+    assert response.headers == {"Allow": "GET, HEAD, POST"}
+    assert response.body == b""
+
+
+def test_load():
+    assert load("server:handle_req") is server.handle_req
+    for spec in ("server", "server:", ":handle_req"):
+        with pytest.raises(ValueError, match="module:name"):
+            load(spec)
+    with pytest.raises(AttributeError):
+        load("server:missing")
@@ -0,0 +1,95 @@
+from assets import build, build_bundle, find_runs, is_hashed_asset, minify_css, minify_js
+
+
+def test_minify_js_drops_comments_and_indentation():
+    source = """// Adds two numbers
+function add(a, b) {
+    /* the sum */
+    return a + b;  // done
+}
+"""
+    assert minify_js(source) == "function add(a,b){\nreturn a+b;\n}\n"
+
+
+def test_minify_js_keeps_strings_regexes_and_templates():
+    source = """const url = "http://example.com"; // a comment
+const quote = '/* not a comment */';
+const re = /\\/\\/[a-z]+/g;
+const ratio = width / height / 2;
+const label = `total: ${ {n: 1}.n } // kept`;
+"""
+    assert minify_js(source) == (
+        'const url="http://example.com";\n'
+        "const quote='/* not a comment */';\n"
+        "const re=/\\/\\/[a-z]+/g;\n"
+        "const ratio=width/height/2;\n"
+        "const label=`total: ${{n:1}.n} // kept`;\n")
+
+
+def test_minify_js_keeps_line_breaks_for_semicolon_insertion():
+    source = "let a = b\n++c\nreturn\nx\nlet d = e - -f\n"
+    assert minify_js(source) == "let a=b\n++c\nreturn\nx\nlet d=e- -f\n"
+
+
+def test_minify_css():
+    source = """/* layout */
+nav  >  a ,
+p {
+    margin: 0 auto;
+    width: calc(100% - 2em);
+    content: "  /* kept */  ";
+}
+"""
+    assert minify_css(source) == (
+        'nav>a,p{margin: 0 auto;width: calc(100% - 2em);content: "  /* kept */  "}\n')
+
+
+def test_is_hashed_asset():
+    assert is_hashed_asset("/assets/bundle.0123456789abcdef.js")
+    assert is_hashed_asset("styles.fedcba9876543210.css")
+    assert not is_hashed_asset("/js/jquery.min.js")
+    assert not is_hashed_asset("bundle.0123456789abcdef.html")
+
+
+def test_find_runs_groups_adjacent_tags():
+    html = ('<script src="/js/a.js"></script>\n  <script src="/js/b.js"></script>\n'
+            '<p>between</p><script src="/js/c.js"></script>'
+            '<script src="/js/d.js" defer></script>')
+    runs = find_runs(html, "js")
+    assert [[url for _, _, url in run] for run in runs] == [["/js/a.js", "/js/b.js"], ["/js/c.js"]]
+
+
+def make_site(root):
+    for directory in ("html", "js", "assets"):
+        (root / directory).mkdir()
+    (root / "js" / "a.js").write_text("// first\nvar a = 1\n")
+    (root / "js" / "b.min.js").write_text("var b=2;// kept as is")
+    (root / "html" / "index.html").write_text(
+        '<head>\n<script src="/js/a.js"></script>\n<script src="/js/b.min.js"></script>\n'
+        '<title>Home</title>\n<script src="/js/missing.js"></script>\n</head>\n')
+
+
+def test_bundle_is_named_by_its_contents(tmp_path):
+    make_site(tmp_path)
+    name, contents = build_bundle("js", ["/js/a.js", "/js/b.min.js"], str(tmp_path))
+    assert contents == b"var a=1;\nvar b=2;// kept as is\n"
+    assert name.startswith("bundle.") and is_hashed_asset(name)
+    name, _ = build_bundle("js", ["/js/b.min.js"], str(tmp_path))
+    assert name.startswith("b.") and name.endswith(".js")
+
+
+def test_build_rewrites_pages_and_removes_old_bundles(tmp_path):
+    make_site(tmp_path)
+    stale = tmp_path / "assets" / "bundle.0123456789abcdef.js"
+    stale.write_text("old")
+    bundles = build(str(tmp_path), str(tmp_path / "html"), str(tmp_path / "assets"),
+                    str(tmp_path / "assets" / "html"))
+    [name] = bundles
+    assert not stale.exists()
+    assert (tmp_path / "assets" / name).stat().st_size == bundles[name]
+    page = (tmp_path / "assets" / "html" / "index.html").read_text()
+    # Tags for files that don't exist are left for the server to answer
+    assert page == (f'<head>\n<script src="/assets/{name}"></script>\n<title>Home</title>\n'
+                    '<script src="/js/missing.js"></script>\n</head>\n')
+    # The source page is left as it was
+    assert 'src="/js/a.js"' in (tmp_path / "html" / "index.html").read_text()
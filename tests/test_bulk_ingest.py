@@ -0,0 +1,102 @@
+import json
+from urllib.parse import urlencode
+
+from event_store import BulkIngest, EventStore
+from myServerStudent import DeferredSink, run_sinks
+
+EVENT = {"event": "Lecture", "day": "Monday", "start": "09:30", "end": "10:45",
+         "phone": "612-555-0100", "location": "Keller 3-210", "url": "https://umn.edu"}
+
+
+def ingest(tmp_path, content_type, chunks):
+    store = EventStore(str(tmp_path / "events.log"))
+    bulk = BulkIngest(store, content_type)
+    for chunk in chunks:
+        bulk.feed(chunk)
+    bulk.close()
+    stored = [store.event(i) for i in range(len(store))]
+    store.close()
+    return bulk.summary(), stored
+
+
+def test_json_lines_split_across_chunks(tmp_path):
+    body = "".join(json.dumps(dict(EVENT, event=f"E{i}")) + "\n" for i in range(3))
+    # The last record has no trailing newline and lines break mid-chunk
+    body = body.rstrip("\n").encode("utf-8")
+    summary, stored = ingest(tmp_path, "application/x-ndjson",
+                             [body[i:i + 7] for i in range(0, len(body), 7)])
+    assert summary == {"accepted": 3, "rejected": 0, "errors": [], "errors_truncated": False}
+    assert [e["event"] for e in stored] == ["E0", "E1", "E2"]
+
+
+def test_form_lines_and_blank_lines(tmp_path):
+    body = (urlencode(EVENT) + "\n\n" + urlencode(dict(EVENT, event="Lab")) + "\n").encode()
+    summary, stored = ingest(tmp_path, "application/x-www-form-urlencoded", [body])
+    assert summary["accepted"] == 2
+    assert [e["event"] for e in stored] == ["Lecture", "Lab"]
+
+
+def test_format_is_guessed_per_line(tmp_path):
+    body = (json.dumps(EVENT) + "\n" + urlencode(dict(EVENT, event="Lab"))).encode()
+    summary, stored = ingest(tmp_path, None, [body])
+    assert summary["accepted"] == 2 and len(stored) == 2
+
+
+def test_bad_records_are_reported_by_line(tmp_path):
+    body = "\n".join([json.dumps(EVENT), "[1, 2]", "{not json",
+                      json.dumps(dict(EVENT, phone="x"))]).encode()
+    summary, stored = ingest(tmp_path, "application/json", [body])
+    assert summary["accepted"] == 1 and summary["rejected"] == 3
+    assert [error["line"] for error in summary["errors"]] == [2, 3, 4]
+    assert summary["errors"][0]["errors"] == ["unreadable record: record must be a JSON object"]
+    assert summary["errors"][2]["errors"] == ["phone must look like 123-456-7890"]
+    assert len(stored) == 1
+
+
+def test_long_lines_are_rejected_without_buffering(tmp_path, monkeypatch):
+    monkeypatch.setattr(BulkIngest, "MAX_LINE", 200)
+    store = EventStore(str(tmp_path / "events.log"))
+    bulk = BulkIngest(store, "application/x-ndjson")
+    bulk.feed(b"{" + b"x" * 150)
+    bulk.feed(b"x" * 150)
+    assert len(bulk.line) == 0
+    bulk.feed(b"\n" + json.dumps(EVENT).encode() + b"\n")
+    bulk.close()
+    store.close()
+    assert bulk.summary()["accepted"] == 1
+    assert bulk.summary()["errors"] == [{"line": 1, "errors": ["line is longer than 200 bytes"]}]
+
+
+def test_error_list_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(BulkIngest, "MAX_ERRORS", 2)
+    summary, _ = ingest(tmp_path, "application/json", [b"[]\n" * 5])
+    assert summary["rejected"] == 5
+    assert len(summary["errors"]) == 2 and summary["errors_truncated"]
+
+
+class RecordingSink:
+    def __init__(self):
+        self.calls = []
+        self.summary = "recorded"
+
+    def feed(self, data):
+        self.calls.append(data)
+
+    def close(self):
+        self.calls.append("close")
+
+
+def test_deferred_sink_queues_until_run():
+    sinks = [DeferredSink(RecordingSink()), DeferredSink(RecordingSink())]
+    sinks[0].feed(b"a")
+    sinks[0].feed(b"b")
+    sinks[1].feed(b"c")
+    sinks[1].close()
+    assert sinks[0].sink.calls == [] and sinks[1].closed
+    run_sinks(sinks)
+    assert sinks[0].sink.calls == [b"a", b"b"]
+    assert sinks[1].sink.calls == [b"c", "close"]
+    # Each call is passed on once, and other attributes come from the real sink
+    run_sinks(sinks)
+    assert sinks[0].sink.calls == [b"a", b"b"]
+    assert sinks[0].summary == "recorded"
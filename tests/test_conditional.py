@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+import pytest
+
+from myServerStudent import HTTPRequest, file_etag, is_not_modified
+
+FILE_STAT = SimpleNamespace(st_mtime=784111777.5)
+
+
+def request_with(headers):
+    return HTTPRequest("GET", "/", "HTTP/1.1",
+                       {name.lower(): value for name, value in headers.items()})
+
+
+@pytest.mark.parametrize("headers, not_modified", [
+    ({}, False),
+    ({"If-None-Match": '"abc"'}, True),
+    ({"If-None-Match": 'W/"abc"'}, True),
+    ({"If-None-Match": '"x", "abc"'}, True),
+    ({"If-None-Match": "*"}, True),
+    ({"If-None-Match": '"x"'}, False),
+    ({"If-Modified-Since": "Sun, 06 Nov 1994 08:49:37 GMT"}, True),
+    ({"If-Modified-Since": "Mon, 07 Nov 1994 08:49:37 GMT"}, True),
+    ({"If-Modified-Since": "Sun, 06 Nov 1994 08:49:36 GMT"}, False),
+    ({"If-Modified-Since": "yesterday"}, False),
+    # If-None-Match wins
+    ({"If-None-Match": '"x"', "If-Modified-Since": "Sun, 06 Nov 1994 08:49:37 GMT"}, False),
+])
+def test_is_not_modified(headers, not_modified):
+    assert is_not_modified(request_with(headers), '"abc"', FILE_STAT) == not_modified
+
+
+def test_etag_changes_with_the_file():
+    def stat(mtime_ns, size):
+        return SimpleNamespace(st_ino=1, st_size=size, st_mtime_ns=mtime_ns, st_mtime=0)
+
+    tag = file_etag(stat(1, 10))
+    assert tag.startswith('"') and tag.endswith('"')
+    assert tag == file_etag(stat(1, 10))
+    assert tag != file_etag(stat(2, 10))
+    assert tag != file_etag(stat(1, 11))
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from event_store import (MAX_EVENT_NAME, BulkIngest, EventStore, StoreClosed, StoreLocked,
+                         validate_event)
+
+EVENT = {"event": "Lecture", "day": "monday", "start": "09:30", "end": "10:45",
+         "phone": "612-555-0100", "location": "Keller 3-210", "url": "https://umn.edu"}
+
+
+def test_reload_rebuilds_indexes(tmp_path):
+    path = tmp_path / "events.log"
+    store = EventStore(str(path))
+    store.append(EVENT)
+    store.append(dict(EVENT, event="Lab", day="Tuesday", start="14:00"))
+    store.append(dict(EVENT, event="Early", start="08:00"))
+    store.close()
+
+    store = EventStore(str(path))
+    try:
+        assert len(store) == 3
+        total, events = store.query(day="Monday")
+        assert total == 2
+        assert [e["event"] for e in events] == ["Early", "Lecture"]
+        assert events[1] == dict(EVENT, id=0)
+        total, events = store.query(start_from=9 * 60, start_to=14 * 60, limit=1)
+        assert total == 2 and events[0]["event"] == "Lecture"
+    finally:
+        store.close()
+
+
+def test_reload_cuts_off_torn_line(tmp_path):
+    path = tmp_path / "events.log"
+    whole = json.dumps(EVENT) + "\n"
+    path.write_text(whole + "not json\n" + '{"event": "Half', encoding="utf-8")
+
+    store = EventStore(str(path))
+    try:
+        # The line that isn't an event is skipped; the torn one is removed
+        assert len(store) == 1
+        assert path.read_text(encoding="utf-8") == whole + "not json\n"
+        store.append(dict(EVENT, event="After"))
+    finally:
+        store.close()
+
+    store = EventStore(str(path))
+    try:
+        assert [store.event(i)["event"] for i in range(len(store))] == ["Lecture", "After"]
+    finally:
+        store.close()
+
+
+def test_query_pages_through_matches(tmp_path):
+    store = EventStore(str(tmp_path / "events.log"))
+    try:
+        for hour in range(10, 15):
+            store.append(dict(EVENT, event=f"E{hour}", start=f"{hour}:00"))
+        store.append(dict(EVENT, event="Later", day="Friday", start="08:00"))
+        store.append(dict(EVENT, event="Untimed", start="soon"))
+        total, events = store.query(day="monday", offset=1, limit=2)
+        assert total == 6
+        assert [e["event"] for e in events] == ["E10", "E11"]
+        # Events without a valid start never match a time window
+        total, _ = store.query(start_from=0)
+        assert total == 6
+        total, events = store.query()
+        assert total == 7 and events[-1]["event"] == "Later"
+    finally:
+        store.close()
+
+
+@pytest.mark.parametrize("changes, error", [
+    ({"phone": "6125550100"}, "phone must look like 123-456-7890"),
+    ({"day": "Someday"}, "day must be one of Monday to Sunday"),
+    ({"start": "25:00"}, "start must be a time like 09:30"),
+    ({"url": "javascript:alert(1)"}, "url must be an http or https URL"),
+    ({"event": "x" * (MAX_EVENT_NAME + 1)}, f"event must be at most {MAX_EVENT_NAME} characters"),
+    ({"location": " "}, "location is missing"),
+])
+def test_validate_event(changes, error):
+    assert validate_event(EVENT) == []
+    assert validate_event(dict(EVENT, **changes)) == [error]
+
+
+
+def test_only_one_store_writes_a_log(tmp_path):
+    path = str(tmp_path / "events.log")
+    store = EventStore(path)
+    try:
+        with pytest.raises(StoreLocked):
+            EventStore(path)
+    finally:
+        store.close()
+
+
+def test_log_is_handed_over_and_taken_back(tmp_path):
+    path = str(tmp_path / "events.log")
+    old = EventStore(path)
+    old.append(EVENT)
+    asked = []
+    old.hand_over()
+    with pytest.raises(StoreClosed):
+        old.append(EVENT)
+    # Queries still answer from what was stored
+    assert len(old) == 1
+
+    new = EventStore(path, on_locked=lambda: asked.append(True))
+    assert asked == [] and len(new) == 1
+    new.append(dict(EVENT, event="New"))
+    new.close()
+
+    # A failed restart gives the log back, with what the new store added
+    old.take_back()
+    old.append(dict(EVENT, event="Old again"))
+    assert [old.event(i)["event"] for i in range(len(old))] == ["Lecture", "New", "Old again"]
+    old.close()
+
+
+def test_bulk_ingest_stops_storing_once_handed_over(tmp_path):
+    store = EventStore(str(tmp_path / "events.log"))
+    store.hand_over()
+    ingest = BulkIngest(store, "application/x-ndjson")
+    ingest.feed((json.dumps(EVENT) + "\n").encode("utf-8") * 2)
+    ingest.close()
+    store.close()
+    assert ingest.store_closed
+    assert ingest.summary()["accepted"] == 0 and ingest.summary()["rejected"] == 2
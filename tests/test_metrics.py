@@ -0,0 +1,64 @@
+import threading
+
+from metrics import Metrics, escape_label, hit_ratio
+
+
+def test_renders_counts_bytes_and_histogram():
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.observe("/", "GET", 200, 0.005, 100)
+    metrics.observe("/", "HEAD", 200, 0.05, 0)
+    metrics.observe("/", "GET", 200, 1.0, 50)
+    lines = metrics.render().splitlines()
+    assert 'http_requests_total{route="/",method="GET",status="200"} 2' in lines
+    assert 'http_requests_total{route="/",method="HEAD",status="200"} 1' in lines
+    # Bytes and latencies are added up over methods
+    assert 'http_response_bytes_total{route="/",status="200"} 150' in lines
+    assert [line for line in lines if line.startswith("http_request_duration_seconds_bucket")] == [
+        'http_request_duration_seconds_bucket{route="/",status="200",le="0.01"} 1',
+        'http_request_duration_seconds_bucket{route="/",status="200",le="0.1"} 2',
+        'http_request_duration_seconds_bucket{route="/",status="200",le="+Inf"} 3',
+    ]
+    assert 'http_request_duration_seconds_count{route="/",status="200"} 3' in lines
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+
+
+def test_adds_up_shards_of_finished_threads():
+    metrics = Metrics()
+    threads = [threading.Thread(target=metrics.observe, args=("/x", "GET", 404, 0.001, 10))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.observe("/x", "GET", 404, 0.001, 10)
+    assert 'http_requests_total{route="/x",method="GET",status="404"} 9' in metrics.render()
+    # Only the live thread's shard is left once the totals are taken
+    assert len(metrics.shards) == 1
+
+
+def test_registered_metrics_are_collected_on_render():
+    metrics = Metrics()
+    entries = [3]
+    metrics.register("cache_entries", "gauge", "Entries in the cache.", lambda: entries[0])
+    metrics.register("workers", "gauge", "Workers by state.",
+                     lambda: [({"state": "busy"}, 1), ({"state": "idle"}, 4)])
+    entries[0] = 5
+    lines = metrics.render().splitlines()
+    assert lines[-7:] == [
+        "# HELP cache_entries Entries in the cache.",
+        "# TYPE cache_entries gauge",
+        "cache_entries 5",
+        "# HELP workers Workers by state.",
+        "# TYPE workers gauge",
+        'workers{state="busy"} 1',
+        'workers{state="idle"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+def test_hit_ratio():
+    assert hit_ratio(0, 0) == 0.0
+    assert hit_ratio(3, 1) == 0.75
@@ -0,0 +1,84 @@
+import os
+import time
+
+from myServerStudent import PathIndex
+
+
+def make_root(root):
+    (root / "static" / "html").mkdir(parents=True)
+    (root / "static" / "css").mkdir()
+    (root / "static" / "html" / "index.html").write_bytes(b"<p>home</p>")
+    (root / "static" / "css" / "styles.css").write_bytes(b"p{}")
+    return PathIndex(str(root), ttl=60)
+
+
+def test_resolves_pages_and_static_files(tmp_path):
+    paths = make_root(tmp_path)
+    page = paths.resolve("html/index.html")
+    assert page.path == str(tmp_path / "static" / "html" / "index.html")
+    assert page.mime_type == "text/html" and page.readable
+    # Found relative to the root, then to "static"
+    assert paths.resolve("css/styles.css").path == str(tmp_path / "static" / "css" / "styles.css")
+    assert paths.resolve("static/css/styles.css") is not None
+
+
+def test_refuses_paths_outside_the_root(tmp_path):
+    paths = make_root(tmp_path)
+    (tmp_path.parent / "outside.txt").write_bytes(b"no")
+    assert paths.lookup("../outside.txt") is None
+    assert paths.lookup("static/../../outside.txt") is None
+    assert paths.lookup("static") is None  # not a regular file
+    assert paths.lookup("bad\0name") is None
+
+
+def test_caches_missing_files(tmp_path):
+    paths = make_root(tmp_path)
+    assert paths.lookup("late.txt") is None
+    (tmp_path / "late.txt").write_bytes(b"now here")
+    # Still missing until the entry expires
+    assert paths.lookup("late.txt") is None
+    stats = paths.stats()
+    assert stats["misses"] == 1 and stats["negative_hits"] == 1
+    assert stats["stat_seconds"] > 0
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    paths = make_root(tmp_path)
+    paths.ttl = 0.05
+    assert paths.lookup("late.txt") is None
+    (tmp_path / "late.txt").write_bytes(b"now here")
+    time.sleep(0.06)
+    assert paths.lookup("late.txt") is not None
+    assert paths.lookup("late.txt") is not None
+    assert paths.stats()["hits"] == 1
+
+
+def test_keeps_at_most_max_entries(tmp_path):
+    paths = make_root(tmp_path)
+    paths.max_entries = 2
+    for name in ("a", "b", "c"):
+        paths.lookup(name)
+    assert paths.stats()["entries"] == 2
+
+
+def test_hide_covers_a_log_and_its_copies_only(tmp_path):
+    paths = make_root(tmp_path)
+    for name in ("access.log", "access.log.1", "access.1234.log", "accessibility.html"):
+        (tmp_path / name).write_bytes(b"x")
+    (tmp_path / "profiles").mkdir()
+    (tmp_path / "profiles" / "run.prof").write_bytes(b"x")
+    paths.hide(os.path.join(str(tmp_path), "access.log"))
+    paths.hide(os.path.join(str(tmp_path), "profiles"))
+    assert paths.lookup("access.log") is None
+    assert paths.lookup("access.log.1") is None
+    assert paths.lookup("access.1234.log") is None
+    assert paths.lookup("profiles/run.prof") is None
+    assert paths.lookup("accessibility.html") is not None
+
+
+def test_reports_files_others_cannot_read(tmp_path):
+    paths = make_root(tmp_path)
+    private = tmp_path / "static" / "html" / "private.html"
+    private.write_bytes(b"secret")
+    os.chmod(private, 0o600)
+    assert not paths.resolve("private.html").readable
@@ -0,0 +1,73 @@
+import pstats
+import threading
+
+from profiler import RequestProfiler
+
+
+def handler(n):
+    return sum(range(n))
+
+
+def profiled_functions(path):
+    return {name for _, _, name in pstats.Stats(path).stats}
+
+
+def test_profiles_the_next_requests_then_dumps(tmp_path):
+    profiler = RequestProfiler(str(tmp_path / "profiles"))
+    assert profiler.profile(handler, 10) == 45
+    assert profiler.start(requests=2)
+    assert not profiler.start(requests=5)
+    assert profiler.profile(handler, 10) == 45
+    assert profiler.status() == {"active": True, "requests": 2, "profiled": 1,
+                                 "last_dump": None}
+    profiler.profile(handler, 10)
+    status = profiler.status()
+    assert not status["active"] and status["profiled"] == 2
+    assert status["last_dump"].startswith(str(tmp_path / "profiles"))
+    assert "handler" in profiled_functions(status["last_dump"])
+    # Calls after the run ends are not profiled
+    profiler.profile(handler, 10)
+    assert profiler.status()["profiled"] == 2
+
+
+def test_one_call_is_profiled_at_a_time(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    profiler.start(requests=10)
+    inside = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        inside.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=profiler.profile, args=(slow,))
+    thread.start()
+    assert inside.wait(5)
+    assert profiler.busy
+    # Runs unprofiled while the other call holds the profiler
+    assert profiler.profile(handler, 4) == 6
+    release.set()
+    thread.join(5)
+    assert not profiler.busy
+    assert profiler.status()["profiled"] == 1
+
+
+def test_timed_run_ends_on_its_own(tmp_path):
+    profiler = RequestProfiler(str(tmp_path))
+    profiler.start(seconds=0.05)
+    timer = profiler.timer
+    profiler.profile(handler, 10)
+    timer.join(5)
+    status = profiler.status()
+    assert not status["active"] and status["requests"] is None
+    assert status["last_dump"] is not None
+
+
+def test_run_without_requests_writes_nothing(tmp_path):
+    profiler = RequestProfiler(str(tmp_path / "profiles"))
+    profiler.start(seconds=60)
+    profiler.finish(profiler.run)
+    assert profiler.status()["last_dump"] is None
+    assert not (tmp_path / "profiles").exists()
+    # A new run can start once the last one is over
+    assert profiler.start()
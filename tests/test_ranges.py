@@ -0,0 +1,34 @@
+import pytest
+
+from myServerStudent import MAX_RANGES, parse_range
+
+
+@pytest.mark.parametrize("header, ranges", [
+    ("bytes=0-9", [(0, 9)]),
+    ("bytes=90-", [(90, 99)]),
+    ("bytes=-10", [(90, 99)]),
+    ("bytes=-500", [(0, 99)]),
+    ("bytes=50-500", [(50, 99)]),
+    ("bytes=0-0, 10-19", [(0, 0), (10, 19)]),
+    ("BYTES=0-0", [(0, 0)]),
+])
+def test_parses_satisfiable_ranges(header, ranges):
+    assert parse_range(header, 100) == ranges
+
+
+def test_unsatisfiable_ranges_are_left_out():
+    assert parse_range("bytes=100-", 100) == []
+    assert parse_range("bytes=-0", 100) == []
+    assert parse_range("bytes=200-300, 0-1", 100) == [(0, 1)]
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=9-0",
+    "bytes=a-b",
+    "bytes=5",
+    "items=0-9",
+    "bytes=",
+    "bytes=" + ",".join(["0-0"] * (MAX_RANGES + 1)),
+])
+def test_ignores_malformed_headers(header):
+    assert parse_range(header, 100) is None
@@ -0,0 +1,119 @@
+import pytest
+
+from myServerStudent import RequestError, RequestParser
+
+
+def test_parses_request_split_over_reads():
+    parser = RequestParser()
+    assert parser.feed(b"GET /index.html?x=1 HTT") == []
+    assert parser.reading == "head"
+    [request] = parser.feed(b"P/1.1\r\nHost: localhost\r\n\r\n")
+    assert (request.method, request.path, request.query) == ("GET", "/index.html", "x=1")
+    assert request.header("HOST") == "localhost"
+    assert parser.reading == "request"
+
+
+def test_reads_content_length_body():
+    parser = RequestParser()
+    assert parser.feed(b"POST /EventLog HTTP/1.1\r\nContent-Length: 5\r\n\r\nab") == []
+    assert parser.reading == "body"
+    [request] = parser.feed(b"cde")
+    assert request.body == b"abcde"
+
+
+def test_decodes_chunked_body():
+    parser = RequestParser()
+    head = b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+    assert parser.feed(head + b"3;ext=1\r\nabc\r\n4\r\nde") == []
+    [request] = parser.feed(b"fg\r\n0\r\nTrailer: x\r\n\r\n")
+    assert request.body == b"abcdefg"
+
+
+@pytest.mark.parametrize("body", [b"zz\r\nab\r\n0\r\n\r\n", b"2\r\nabXY0\r\n\r\n"])
+def test_rejects_malformed_chunks(body):
+    parser = RequestParser()
+    with pytest.raises(RequestError) as error:
+        parser.feed(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" + body)
+    assert error.value.status == "400 BAD REQUEST"
+
+
+def test_answers_pipelined_requests_in_order():
+    parser = RequestParser()
+    requests = parser.feed(b"GET /a HTTP/1.1\r\n\r\n"
+                           b"POST /b HTTP/1.1\r\nContent-Length: 2\r\n\r\nhi"
+                           b"GET /c HTTP/1.1\r\n")
+    assert [(r.path, r.body) for r in requests] == [("/a", b""), ("/b", b"hi")]
+    [request] = parser.feed(b"\r\n")
+    assert request.path == "/c"
+
+
+def test_refuses_head_too_large():
+    parser = RequestParser(max_header_size=64)
+    with pytest.raises(RequestError) as error:
+        parser.feed(b"GET / HTTP/1.1\r\nCookie: " + b"x" * 100)
+    assert error.value.status == "431 REQUEST HEADER FIELDS TOO LARGE"
+
+
+def test_refuses_body_too_large():
+    parser = RequestParser(max_body_size=4)
+    with pytest.raises(RequestError) as error:
+        parser.feed(b"POST / HTTP/1.1\r\nContent-Length: 5\r\n\r\n")
+    assert error.value.status == "413 CONTENT TOO LARGE"
+
+    parser = RequestParser(max_body_size=4)
+    with pytest.raises(RequestError) as error:
+        parser.feed(b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n2\r\n")
+    assert error.value.status == "413 CONTENT TOO LARGE"
+
+
+def test_streams_body_to_sink():
+    class Sink:
+        def __init__(self):
+            self.data = b""
+            self.closed = False
+
+        def feed(self, data):
+            self.data += data
+
+        def close(self):
+            self.closed = True
+
+    sink = Sink()
+    parser = RequestParser(max_body_size=2, body_sink=lambda request: sink)
+    parser.feed(b"POST / HTTP/1.1\r\nContent-Length: 6\r\n\r\nabc")
+    [request] = parser.feed(b"def")
+    assert request.sink is sink and request.body == b""
+    assert sink.data == b"abcdef" and sink.closed
+
+
+def test_waits_for_continue_only_when_asked():
+    parser = RequestParser()
+    parser.feed(b"POST / HTTP/1.1\r\nExpect: 100-continue\r\nContent-Length: 2\r\n\r\n")
+    assert parser.send_continue
+    parser.feed(b"ok")
+    assert not parser.send_continue
+
+    parser = RequestParser()
+    parser.feed(b"POST / HTTP/1.0\r\nExpect: 100-continue\r\nContent-Length: 2\r\n\r\n")
+    assert not parser.send_continue
+
+
+@pytest.mark.parametrize("head, status", [
+    (b"POST / HTTP/1.1\r\nContent-Length: abc\r\n\r\n", "400 BAD REQUEST"),
+    (b"POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", "400 BAD REQUEST"),
+    (b"POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n", "501 NOT IMPLEMENTED"),
+])
+def test_rejects_bad_framing(head, status):
+    with pytest.raises(RequestError) as error:
+        RequestParser().feed(head)
+    assert error.value.status == status
+
+
+def test_keep_alive_follows_version_and_connection_header():
+    [http11, close, http10, http10_keep] = RequestParser().feed(
+        b"GET / HTTP/1.1\r\n\r\n"
+        b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n"
+        b"GET / HTTP/1.0\r\n\r\n"
+        b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+    assert http11.keep_alive and not close.keep_alive
+    assert not http10.keep_alive and http10_keep.keep_alive
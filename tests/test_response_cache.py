@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from myServerStudent import ResponseCache
+
+
+def file_stat(mtime_ns=1, size=10):
+    return SimpleNamespace(st_mtime_ns=mtime_ns, st_size=size)
+
+
+def test_returns_cached_response():
+    cache = ResponseCache(max_bytes=100)
+    assert cache.get("a", file_stat()) is None
+    cache.put("a", file_stat(), b"head", b"body")
+    assert cache.get("a", file_stat()) == (b"head", b"body")
+    assert cache.stats() == {"entries": 1, "bytes": 8, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_evicts_least_recently_used_to_stay_within_budget():
+    cache = ResponseCache(max_bytes=20)
+    cache.put("a", file_stat(), b"", b"a" * 8)
+    cache.put("b", file_stat(), b"", b"b" * 8)
+    # Using "a" makes "b" the oldest
+    assert cache.get("a", file_stat()) is not None
+    cache.put("c", file_stat(), b"", b"c" * 8)
+    assert cache.get("b", file_stat()) is None
+    assert cache.get("a", file_stat()) is not None
+    assert cache.get("c", file_stat()) is not None
+    stats = cache.stats()
+    assert stats["bytes"] == 16 and stats["evictions"] == 1
+
+
+def test_skips_responses_bigger_than_the_budget():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", file_stat(), b"", b"a" * 5)
+    cache.put("big", file_stat(), b"", b"x" * 11)
+    assert cache.get("big", file_stat()) is None
+    assert cache.get("a", file_stat()) is not None
+
+
+def test_drops_entry_when_file_changes():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("a", file_stat(mtime_ns=1, size=10), b"h", b"b")
+    assert cache.get("a", file_stat(mtime_ns=2, size=10)) is None
+    # Gone for good, even for the old version
+    assert cache.get("a", file_stat(mtime_ns=1, size=10)) is None
+    cache.put("a", file_stat(mtime_ns=1, size=10), b"h", b"b")
+    assert cache.get("a", file_stat(mtime_ns=1, size=11)) is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_replacing_entry_keeps_size_right():
+    cache = ResponseCache(max_bytes=100)
+    cache.put("a", file_stat(), b"h", b"12345")
+    cache.put("a", file_stat(mtime_ns=2), b"h", b"12")
+    assert cache.stats()["bytes"] == 3
+    assert cache.get("a", file_stat(mtime_ns=2)) == (b"h", b"12")
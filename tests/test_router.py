@@ -0,0 +1,55 @@
+import os
+
+import server
+from server import Router, build_routes
+
+
+def make_site(root):
+    (root / "html").mkdir()
+    (root / "css").mkdir()
+    (root / "html" / "index.html").write_bytes(b"<p>home</p>")
+    (root / "html" / "myform.html").write_bytes(b"<form></form>")
+    (root / "css" / "styles.css").write_bytes(b"p{}")
+    (root / "notes.txt").write_bytes(b"not served")
+    return str(root)
+
+
+def test_routes_every_static_file(tmp_path):
+    routes = build_routes(make_site(tmp_path))
+    assert routes["/css/styles.css"] == (b"p{}", "text/css")
+    form = (b"<form></form>", "text/html")
+    assert routes["/html/myform.html"] == routes["/html/myform"] == routes["/myform"] == form
+    assert routes["/"] == (b"<p>home</p>", "text/html")
+    assert "/notes.txt" not in routes
+
+
+def test_leaves_out_files_others_cannot_read(tmp_path):
+    static_dir = make_site(tmp_path)
+    private = tmp_path / "html" / "private.html"
+    private.write_bytes(b"secret")
+    os.chmod(private, 0o600)
+    routes = build_routes(static_dir)
+    assert "/html/private.html" not in routes and "/private" not in routes
+
+
+def test_reloads_changed_files_only_when_asked(tmp_path):
+    static_dir = make_site(tmp_path)
+    fixed = Router(static_dir)
+    reloading = Router(static_dir, reload_interval=0)
+    (tmp_path / "css" / "styles.css").write_bytes(b"p{color:red}")
+    (tmp_path / "css" / "new.css").write_bytes(b"a{}")
+    assert fixed.lookup("/css/styles.css")[0] == b"p{}"
+    assert fixed.lookup("/css/new.css") is None
+    assert reloading.lookup("/css/styles.css")[0] == b"p{color:red}"
+    assert reloading.lookup("/css/new.css") == (b"a{}", "text/css")
+
+
+def test_handle_req_answers_dynamic_routes_and_missing_pages():
+    content, content_type = server.handle_req(
+        "/html/EventLog.html?event=<b>x</b>&day=Mon&start=1&end=2&phone=3&location=4&url=5")
+    assert content_type.startswith("text/html")
+    assert b"&lt;b&gt;x&lt;/b&gt;" in content and b"<b>x</b>" not in content
+    assert server.handle_req("/html/EventLog.html?event=x") == ("Missing form parameters",
+                                                                "text/plain")
+    content, content_type = server.handle_req("/no/such/page")
+    assert content_type.startswith("text/html")
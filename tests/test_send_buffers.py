@@ -0,0 +1,100 @@
+import socket
+import threading
+
+from myServerStudent import (MAX_SEND_BUFFERS, HTTPResponse, encode_chunks, send_buffers,
+                             send_response)
+
+
+class TrickleSocket:
+    """Accepts at most `limit` bytes per `sendmsg`, like a full socket buffer"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = b""
+        self.calls = []
+
+    def sendmsg(self, buffers):
+        self.calls.append(len(buffers))
+        sent = b"".join(bytes(buffer) for buffer in buffers)[:self.limit]
+        self.data += sent
+        return len(sent)
+
+
+class PlainSocket:
+    def __init__(self):
+        self.data = b""
+
+    def sendall(self, data):
+        self.data += bytes(data)
+
+
+def test_resumes_after_partial_writes():
+    sock = TrickleSocket(limit=3)
+    send_buffers(sock, [b"head", b"", memoryview(b"body"), bytearray(b"!")])
+    assert sock.data == b"headbody!"
+    # Everything is offered together; only what's left is offered again
+    assert sock.calls[0] == 3
+    assert len(sock.calls) == 3
+
+
+def test_gives_at_most_max_send_buffers_per_call():
+    sock = TrickleSocket(limit=10 ** 6)
+    send_buffers(sock, [b"x"] * (MAX_SEND_BUFFERS + 5))
+    assert sock.calls == [MAX_SEND_BUFFERS, 5]
+    assert sock.data == b"x" * (MAX_SEND_BUFFERS + 5)
+
+
+def test_falls_back_to_sendall():
+    sock = PlainSocket()
+    send_buffers(sock, [b"a", b"b"])
+    assert sock.data == b"ab"
+
+
+def test_encode_chunks_frames_without_copying():
+    data = b"hello"
+    chunks = list(encode_chunks(iter([data, b"", b"!"])))
+    assert chunks == [[b"5\r\n", data, b"\r\n"], [b"1\r\n", b"!", b"\r\n"], [b"0\r\n\r\n"]]
+    assert chunks[0][1] is data
+
+
+def test_encode_chunks_closes_the_body():
+    closed = []
+
+    def body():
+        try:
+            yield b"a"
+            yield b"b"
+        finally:
+            closed.append(True)
+
+    chunks = encode_chunks(body())
+    next(chunks)
+    chunks.close()
+    assert closed == [True]
+
+
+def test_send_response_writes_parts_file_ranges_and_stream(tmp_path):
+    path = tmp_path / "file.bin"
+    path.write_bytes(b"0123456789")
+    response = HTTPResponse(b"HEAD|", [b"a|", (2, 3), b"|", (8, 2)], str(path),
+                            stream=encode_chunks(iter([b"xy"])))
+    client, server = socket.socketpair()
+    received = []
+    reader = threading.Thread(target=lambda: received.append(read_all(server)))
+    reader.start()
+    send_response(client, response)
+    client.close()
+    reader.join()
+    server.close()
+    assert received[0] == b"HEAD|a|234|89" + b"2\r\nxy\r\n0\r\n\r\n"
+    assert response.streamed == len(b"2\r\nxy\r\n0\r\n\r\n")
+    assert response.size == len(received[0])
+
+
+def read_all(sock):
+    data = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return data
+        data += chunk
@@ -0,0 +1,125 @@
+import threading
+
+import pytest
+
+import stock_quotes
+from stock_quotes import QuoteCache, UpstreamError, normalize_symbol
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(stock_quotes.time, "monotonic", clock)
+    return clock
+
+
+class Upstream:
+    """Counts fetches, and holds each one until `release` is set"""
+
+    def __init__(self, quote=None, error=None):
+        self.quote = quote
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, symbol):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return dict(self.quote or {"symbol": symbol}, call=self.calls)
+
+
+@pytest.mark.parametrize("symbol, normalized", [
+    (" ibm ", "IBM"), ("brk.b", "BRK.B"), ("RDS-A", "RDS-A"),
+    ("", None), ("-IBM", None), ("IBM&apikey=x", None), ("ABCDEFGHIJK", None),
+])
+def test_normalize_symbol(symbol, normalized):
+    assert normalize_symbol(symbol) == normalized
+
+
+def test_concurrent_misses_share_one_fetch(clock):
+    upstream = Upstream()
+    upstream.release.clear()
+    cache = QuoteCache(upstream)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("IBM")))
+               for _ in range(5)]
+    threads[0].start()
+    assert upstream.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 4:
+        threading.Event().wait(0.01)
+    upstream.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert upstream.calls == 1
+    assert [r[:2] for r in results] == [({"symbol": "IBM", "call": 1}, "MISS")] * 5
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 4
+
+
+def test_fresh_then_stale_then_refreshed(clock):
+    upstream = Upstream()
+    cache = QuoteCache(upstream, ttl=60, stale_ttl=600)
+    assert cache.get("IBM") == ({"symbol": "IBM", "call": 1}, "MISS", 60)
+    clock.now += 20
+    assert cache.get("IBM") == ({"symbol": "IBM", "call": 1}, "HIT", 40)
+
+    # Past the TTL the old quote comes back at once, while a refresh runs
+    upstream.started.clear()
+    clock.now += 50
+    assert cache.get("IBM") == ({"symbol": "IBM", "call": 1}, "STALE", 0)
+    assert upstream.started.wait(5)
+    while cache.in_flight:
+        threading.Event().wait(0.01)
+    assert cache.get("IBM")[:2] == ({"symbol": "IBM", "call": 2}, "HIT")
+
+    # Too old to serve even stale: fetched again in the foreground
+    clock.now += 1000
+    assert cache.get("IBM")[:2] == ({"symbol": "IBM", "call": 3}, "MISS")
+
+
+def test_errors_and_rate_limits_keep_the_last_quote(clock):
+    upstream = Upstream()
+    cache = QuoteCache(upstream, ttl=60, stale_ttl=0)
+    cache.get("IBM")
+    clock.now += 61
+    upstream.error = OSError("connection refused")
+    assert cache.get("IBM") == ({"symbol": "IBM", "call": 1}, "STALE", 0)
+
+    upstream.error = None
+    upstream.quote = {"Note": "rate limited"}
+    assert cache.get("IBM") == ({"symbol": "IBM", "call": 1}, "STALE", 0)
+    # A notice for a symbol we have nothing for is passed on, uncached
+    assert cache.get("AAPL") == ({"Note": "rate limited", "call": 4}, "MISS", 0)
+    assert "AAPL" not in cache.entries
+
+
+def test_failed_fetch_without_a_quote_raises(clock):
+    cache = QuoteCache(Upstream(error=OSError("timed out")))
+    with pytest.raises(UpstreamError, match="Could not fetch IBM"):
+        cache.get("IBM")
+    assert cache.stats()["errors"] == 1
+    # The flight ended, so the next lookup tries again
+    assert not cache.in_flight
+
+
+def test_least_recently_used_symbol_is_evicted(clock):
+    cache = QuoteCache(Upstream(), max_entries=2)
+    cache.get("A")
+    cache.get("B")
+    cache.get("A")
+    cache.get("C")
+    assert list(cache.entries) == ["A", "C"]
@@ -0,0 +1,60 @@
+from templates import Template, render_event_page, render_event_row, safe_url
+
+EVENT = {"event": "<script>alert(1)</script>", "day": "Mon", "start": "09:00",
+         "end": "10:00", "phone": "612-555-0100", "location": 'Keller "3-210"',
+         "url": "https://example.com/?a=1&b=2"}
+
+
+def test_fills_placeholders_with_escaped_values():
+    template = Template("<p title={{title}}>{{body}}</p>")
+    assert b"".join(template.render(title='"x"', body="a & <b>")) == \
+        b"<p title=&quot;x&quot;>a &amp; &lt;b&gt;</p>"
+
+
+def test_inserts_rendered_segments_as_is():
+    inner = Template("<b>{{text}}</b>").render(text="<i>")
+    assert b"".join(Template("<p>{{inner}}</p>").render(inner=inner)) == b"<p><b>&lt;i&gt;</b></p>"
+
+
+def test_literal_text_is_encoded_once():
+    template = Template("<p>{{a}}</p>")
+    assert template.render(a="1")[0] is template.render(a="2")[0]
+
+
+def test_event_row_escapes_every_field():
+    row = b"".join(render_event_row(EVENT))
+    assert b"<script>" not in row
+    assert b"&lt;script&gt;alert(1)&lt;/script&gt;" in row
+    assert b"Keller &quot;3-210&quot;" in row
+    assert b'href="https://example.com/?a=1&amp;b=2"' in row
+
+
+def test_event_row_leaves_missing_fields_empty():
+    row = b"".join(render_event_row({"event": "Sleep"}))
+    assert b"<td>Sleep</td>" in row and b"<td></td>" in row
+
+
+def test_only_safe_links_are_kept():
+    assert safe_url("https://example.com") == "https://example.com"
+    assert safe_url("mailto:me@example.com") == "mailto:me@example.com"
+    assert safe_url("/relative") == "/relative"
+    assert safe_url("javascript:alert(1)") == "#"
+    assert safe_url(" JavaScript:alert(1)") == "#"
+    assert safe_url("data:text/html,x") == "#"
+    row = b"".join(render_event_row(dict(EVENT, url="javascript:alert(1)")))
+    assert b'href="#"' in row
+
+
+def test_event_page_lists_events():
+    page = b"".join(render_event_page([EVENT, {"event": "Second"}], heading="Events"))
+    assert page.count(b"<tr>") == 3  # the header row and one per event
+    assert b"<h1>Events</h1>" in page
+    assert b"<td>Second</td>" in page
+
+
+def test_event_page_lists_errors_under_the_heading():
+    page = b"".join(render_event_page([EVENT], heading="Event Not Saved",
+                                      errors=["phone is <missing>"]))
+    assert b"<li>phone is &lt;missing&gt;</li>" in page
+    assert page.index(b"</h1>") < page.index(b'class="errors"') < page.index(b"<table>")
+    assert b'class="errors"' not in b"".join(render_event_page([EVENT]))